@@ -0,0 +1,212 @@
+import base64
+import json
+from http import HTTPStatus
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post, Recommendation
+
+User = get_user_model()
+
+POSTS_COUNT = 13
+
+
+class ApiReadTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='auth')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Test group',
+            slug='test-slug',
+            description='Test description',
+        )
+        Post.objects.bulk_create(
+            Post(text=f'Text {i}', author=cls.user, group=cls.group)
+            for i in range(POSTS_COUNT)
+        )
+        cls.post = Post.objects.latest('id')
+        Comment.objects.create(post=cls.post, author=cls.reader, text='Hi')
+        Follow.objects.create(user=cls.reader, author=cls.user)
+
+    def setUp(self):
+        self.guest_client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.reader)
+
+    def test_feeds(self):
+        """Feeds return posts of their scope."""
+        urls = {
+            reverse('api:index'): self.guest_client,
+            reverse('api:group', args=[self.group.slug]): self.guest_client,
+            reverse('api:profile', args=[self.user]): self.guest_client,
+            reverse('api:follow_index'): self.authorized_client,
+        }
+        for url, client in urls.items():
+            with self.subTest(url=url):
+                response = client.get(url)
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+                results = response.json()['results']
+                self.assertEqual(len(results), 10)
+                self.assertEqual(results[0]['author'], 'auth')
+                self.assertEqual(results[0]['group'], 'test-slug')
+
+    def test_cursor_pagination(self):
+        """Cursor pages go through the whole feed without repeats."""
+        url = reverse('api:index')
+        ids = []
+        params = {'limit': 5, 'fields': 'id'}
+        while True:
+            data = self.guest_client.get(url, params).json()
+            ids += [item['id'] for item in data['results']]
+            if not data['next']:
+                break
+            params['cursor'] = data['next']
+        self.assertEqual(
+            ids, list(Post.objects.order_by('-pub_date', '-id')
+                      .values_list('id', flat=True)))
+
+    def test_projection_selects_only_requested_columns(self):
+        """?fields= limits the output and the selected columns."""
+        url = reverse('api:post_detail', args=[self.post.id])
+        with self.assertNumQueries(1) as queries:
+            response = self.guest_client.get(url, {'fields': 'id,author'})
+        self.assertEqual(
+            response.json(), {'id': self.post.id, 'author': 'auth'})
+        sql = queries.captured_queries[0]['sql']
+        self.assertNotIn('"text"', sql)
+
+    def test_comments(self):
+        """Comments of the post are listed."""
+        response = self.guest_client.get(
+            reverse('api:comments', args=[self.post.id]))
+        results = response.json()['results']
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0]['text'], 'Hi')
+
+    def test_recommendations(self):
+        Recommendation.objects.create(
+            user=self.reader, author=self.user, rank=0, score=1.5)
+        response = self.authorized_client.get(
+            reverse('api:recommendations'))
+        self.assertEqual(
+            response.json()['results'], [{'author': 'auth', 'score': 1.5}])
+        response = self.guest_client.get(reverse('api:recommendations'))
+        self.assertEqual(response.status_code, HTTPStatus.UNAUTHORIZED)
+
+    def test_mail_status_for_staff(self):
+        url = reverse('api:mail_status')
+        response = self.authorized_client.get(url)
+        self.assertEqual(response.status_code, HTTPStatus.FORBIDDEN)
+        self.reader.is_staff = True
+        self.reader.save()
+        response = self.authorized_client.get(url)
+        self.assertIn('depth', response.json())
+
+    def test_errors(self):
+        """Bad requests get JSON errors."""
+        requests = {
+            reverse('api:index') + '?fields=password': HTTPStatus.BAD_REQUEST,
+            reverse('api:index') + '?cursor=bad': HTTPStatus.BAD_REQUEST,
+            reverse('api:group', args=['unknown']): HTTPStatus.NOT_FOUND,
+            reverse('api:post_detail', args=[0]): HTTPStatus.NOT_FOUND,
+            reverse('api:follow_index'): HTTPStatus.UNAUTHORIZED,
+        }
+        for url, status in requests.items():
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                self.assertEqual(response.status_code, status)
+                self.assertIn('detail', response.json())
+
+
+class ApiBulkWriteTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='partner', password='secret-password')
+        cls.group = Group.objects.create(
+            title='Test group',
+            slug='test-slug',
+            description='Test description',
+        )
+        cls.post = Post.objects.create(text='Text', author=cls.user)
+
+    def setUp(self):
+        credentials = base64.b64encode(b'partner:secret-password').decode()
+        self.auth = {'HTTP_AUTHORIZATION': f'Basic {credentials}'}
+        self.client = Client(enforce_csrf_checks=True)
+
+    def post_json(self, url, data, **extra):
+        return self.client.post(
+            url, json.dumps(data), content_type='application/json', **extra)
+
+    def test_bulk_posts(self):
+        """Valid posts are created, invalid ones get errors."""
+        items = [
+            {'text': 'First', 'group': self.group.id},
+            {'text': ''},
+            {'text': 'Second'},
+            {'text': 'Third', 'group': 0},
+        ]
+        response = self.post_json(
+            reverse('api:bulk_posts'), {'items': items}, **self.auth)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        data = response.json()
+        self.assertEqual((data['created'], data['failed']), (2, 2))
+        results = data['results']
+        self.assertIn('text', results[1]['errors'])
+        self.assertIn('group', results[3]['errors'])
+        first = Post.objects.get(id=results[0]['id'])
+        self.assertEqual(
+            (first.text, first.group, first.author),
+            ('First', self.group, self.user),
+        )
+        self.assertEqual(Post.objects.get(id=results[2]['id']).text, 'Second')
+
+    def test_bulk_comments(self):
+        """Comments are created for existing posts only."""
+        items = [
+            {'post': self.post.id, 'text': 'Hi'},
+            {'post': 0, 'text': 'Lost'},
+        ]
+        response = self.post_json(
+            reverse('api:bulk_comments'), {'items': items}, **self.auth)
+        results = response.json()['results']
+        self.assertEqual(Comment.objects.get(id=results[0]['id']).text, 'Hi')
+        self.assertIn('post', results[1]['errors'])
+
+    def test_bulk_comments_malformed_post(self):
+        """Post ids which are not integers reject the batch."""
+        items = [
+            {'post': self.post.id, 'text': 'Hi'},
+            {'post': [self.post.id], 'text': 'List'},
+            {'post': True, 'text': 'Bool'},
+        ]
+        response = self.post_json(
+            reverse('api:bulk_comments'), {'items': items}, **self.auth)
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+        self.assertEqual(
+            [error['index'] for error in response.json()['errors']], [1, 2])
+        self.assertFalse(Comment.objects.exists())
+
+    def test_bulk_rejects(self):
+        """Anonymous, CSRF-less and oversized requests are rejected."""
+        url = reverse('api:bulk_posts')
+        self.assertEqual(
+            self.post_json(url, {'items': [{'text': 'A'}]}).status_code,
+            HTTPStatus.UNAUTHORIZED,
+        )
+        self.client.force_login(self.user)
+        self.assertEqual(
+            self.post_json(url, {'items': [{'text': 'A'}]}).status_code,
+            HTTPStatus.FORBIDDEN,
+        )
+        items = [{'text': 'A'}] * (settings.API_BULK_MAX_ITEMS + 1)
+        self.assertEqual(
+            self.post_json(url, {'items': items}, **self.auth).status_code,
+            HTTPStatus.BAD_REQUEST,
+        )
+        self.assertEqual(Post.objects.count(), 1)
@@ -0,0 +1,34 @@
+from django.urls import path
+
+from . import views
+
+app_name = 'api'
+
+urlpatterns = [
+    # Feeds
+    path('v1/posts/', views.index, name='index'),
+    path('v1/groups/<slug:slug>/posts/', views.group_posts, name='group'),
+    path(
+        'v1/profiles/<str:username>/posts/',
+        views.profile,
+        name='profile'
+    ),
+    path('v1/follow/', views.follow_index, name='follow_index'),
+    path(
+        'v1/recommendations/',
+        views.recommendations,
+        name='recommendations'
+    ),
+    # Batches of new posts and comments
+    path('v1/posts/bulk/', views.bulk_posts, name='bulk_posts'),
+    path('v1/comments/bulk/', views.bulk_comments, name='bulk_comments'),
+    # Outgoing mail queue
+    path('v1/status/mail/', views.mail_status, name='mail_status'),
+    # One post and its comments
+    path('v1/posts/<int:post_id>/', views.post_detail, name='post_detail'),
+    path(
+        'v1/posts/<int:post_id>/comments/',
+        views.comments,
+        name='comments'
+    ),
+]
@@ -0,0 +1,361 @@
+import base64
+import json
+from functools import wraps
+from http import HTTPStatus
+
+from django.conf import settings
+from django.contrib.auth import authenticate
+from django.db import transaction
+from django.db.models import Q
+from django.http import Http404, JsonResponse
+from django.middleware.csrf import CsrfViewMiddleware
+from django.utils.dateparse import parse_datetime
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+
+from core.mail import mail_queue
+from posts import queries, trending
+from posts.caching import bump
+from posts.forms import CommentForm, PostForm
+from posts.models import Comment, Group, Post, User
+from posts.signals import posts_created
+
+# Field of the API -> column for values_list()
+POST_FIELDS = {
+    'id': 'id',
+    'text': 'text',
+    'pub_date': 'pub_date',
+    'author': 'author__username',
+    'group': 'group__slug',
+    'image': 'image',
+    'views': 'views',
+}
+COMMENT_FIELDS = {
+    'id': 'id',
+    'post': 'post_id',
+    'author': 'author__username',
+    'text': 'text',
+    'created': 'created',
+}
+
+
+class ApiError(Exception):
+    def __init__(self, message, status=HTTPStatus.BAD_REQUEST, errors=None):
+        super().__init__(message)
+        self.status = status
+        self.errors = errors
+
+    def response(self):
+        data = {'detail': str(self)}
+        if self.errors is not None:
+            data['errors'] = self.errors
+        return JsonResponse(data, status=self.status)
+
+
+def api_view(view):
+    """Allow only GET and turn errors into JSON responses."""
+    @require_GET
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        try:
+            return JsonResponse(view(request, *args, **kwargs))
+        except ApiError as error:
+            return error.response()
+        except Http404:
+            return JsonResponse(
+                {'detail': 'Not found'}, status=HTTPStatus.NOT_FOUND)
+    return wrapper
+
+
+def api_write_view(view):
+    """Allow only POST from an authenticated user, errors as JSON.
+
+    The user is taken from HTTP Basic credentials, which need no CSRF
+    token, or from the session, which does.
+    """
+    @csrf_exempt
+    @require_POST
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        user = basic_auth_user(request)
+        if user is None and request.user.is_authenticated:
+            rejected = CsrfViewMiddleware().process_view(
+                request, None, (), {})
+            if rejected is not None:
+                return JsonResponse(
+                    {'detail': 'CSRF check failed'},
+                    status=HTTPStatus.FORBIDDEN,
+                )
+            user = request.user
+        if user is None:
+            return JsonResponse(
+                {'detail': 'Authentication required'},
+                status=HTTPStatus.UNAUTHORIZED,
+            )
+        try:
+            return JsonResponse(view(request, user, *args, **kwargs))
+        except ApiError as error:
+            return error.response()
+    return wrapper
+
+
+def basic_auth_user(request):
+    """User from the Authorization: Basic header, if it is valid."""
+    kind, _, credentials = request.META.get(
+        'HTTP_AUTHORIZATION', '').partition(' ')
+    if kind.lower() != 'basic':
+        return None
+    try:
+        username, _, password = base64.b64decode(
+            credentials).decode().partition(':')
+    except ValueError:
+        return None
+    return authenticate(request, username=username, password=password)
+
+
+def projection(request, available):
+    """Fields requested with ?fields=, all by default."""
+    fields = request.GET.get('fields')
+    if not fields:
+        return list(available)
+    fields = [field.strip() for field in fields.split(',') if field.strip()]
+    unknown = [field for field in fields if field not in available]
+    if unknown:
+        raise ApiError('Unknown fields: {}'.format(', '.join(unknown)))
+    return fields
+
+
+def serialize(fields, rows):
+    """Turn rows of values_list() into dicts of the requested fields."""
+    result = [dict(zip(fields, row)) for row in rows]
+    if 'image' in fields:
+        for item in result:
+            item['image'] = (
+                settings.MEDIA_URL + item['image'] if item['image'] else None
+            )
+    return result
+
+
+def encode_cursor(moment, pk):
+    raw = '{}|{}'.format(moment.isoformat(), pk)
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        moment, pk = base64.urlsafe_b64decode(
+            cursor.encode()).decode().split('|')
+        moment, pk = parse_datetime(moment), int(pk)
+    except ValueError:
+        moment = None
+    if moment is None:
+        raise ApiError('Invalid cursor')
+    return moment, pk
+
+
+def cursor_page(request, queryset, available, date_field):
+    """Page of the feed after ?cursor=, at most ?limit= rows.
+
+    Rows are ordered by date and id, the cursor holds both of the last
+    row, so pages stay stable while new rows are added on top.
+    """
+    fields = projection(request, available)
+    try:
+        limit = int(request.GET.get('limit', settings.POSTS_IN_PAGINATOR))
+    except ValueError:
+        raise ApiError('Invalid limit')
+    limit = max(1, min(limit, settings.API_MAX_LIMIT))
+    queryset = queryset.order_by('-' + date_field, '-id')
+    cursor = request.GET.get('cursor')
+    if cursor:
+        moment, pk = decode_cursor(cursor)
+        queryset = queryset.filter(
+            Q(**{date_field + '__lt': moment})
+            | Q(**{date_field: moment, 'id__lt': pk})
+        )
+    columns = [available[field] for field in fields]
+    data = list(
+        queryset.values_list(*columns, date_field, 'id')[:limit + 1]
+    )
+    next_cursor = None
+    if len(data) > limit:
+        next_cursor = encode_cursor(*data[limit - 1][-2:])
+    page = serialize(fields, (row[:-2] for row in data[:limit]))
+    return {'results': page, 'next': next_cursor}
+
+
+def object_id(queryset, **lookup):
+    pk = queryset.filter(**lookup).values_list('id', flat=True).first()
+    if pk is None:
+        raise Http404
+    return pk
+
+
+@api_view
+def index(request):
+    return cursor_page(request, queries.feed(), POST_FIELDS, 'pub_date')
+
+
+@api_view
+def group_posts(request, slug):
+    group_id = object_id(Group.objects, slug=slug)
+    return cursor_page(
+        request, queries.group_feed(group_id), POST_FIELDS, 'pub_date')
+
+
+@api_view
+def profile(request, username):
+    author_id = object_id(User.objects, username=username)
+    return cursor_page(
+        request, queries.author_feed(author_id), POST_FIELDS, 'pub_date')
+
+
+@api_view
+def follow_index(request):
+    if not request.user.is_authenticated:
+        raise ApiError(
+            'Authentication required', status=HTTPStatus.UNAUTHORIZED)
+    return cursor_page(
+        request, queries.follow_feed(request.user), POST_FIELDS, 'pub_date')
+
+
+@api_view
+def recommendations(request):
+    """Authors to follow, best first: {"author", "score"}."""
+    if not request.user.is_authenticated:
+        raise ApiError(
+            'Authentication required', status=HTTPStatus.UNAUTHORIZED)
+    rows = queries.recommended_authors(request.user.id).values_list(
+        'author__username', 'score')
+    return {'results': serialize(['author', 'score'], rows)}
+
+
+@api_view
+def mail_status(request):
+    """Outgoing mail of this process, for staff."""
+    if not request.user.is_staff:
+        raise ApiError('Staff only', status=HTTPStatus.FORBIDDEN)
+    return mail_queue.stats()
+
+
+@api_view
+def post_detail(request, post_id):
+    fields = projection(request, POST_FIELDS)
+    columns = [POST_FIELDS[field] for field in fields]
+    result = serialize(
+        fields, queries.feed().filter(id=post_id).values_list(*columns)
+    )
+    if not result:
+        raise Http404
+    return result[0]
+
+
+@api_view
+def comments(request, post_id):
+    object_id(queries.feed(), id=post_id)
+    return cursor_page(
+        request, queries.post_comments(post_id), COMMENT_FIELDS, 'created')
+
+
+def bulk_items(request):
+    """Items of the batch from the JSON body {"items": [...]}."""
+    try:
+        items = json.loads(request.body)['items']
+    except (ValueError, KeyError, TypeError):
+        raise ApiError('Expected JSON object with "items" list')
+    if not isinstance(items, list) or not items:
+        raise ApiError('Expected JSON object with "items" list')
+    if len(items) > settings.API_BULK_MAX_ITEMS:
+        raise ApiError(
+            f'At most {settings.API_BULK_MAX_ITEMS} items in one request')
+    if not all(isinstance(item, dict) for item in items):
+        raise ApiError('Items must be JSON objects')
+    return items
+
+
+def bulk_insert(model, objects, author):
+    """Insert objects in one transaction and set their ids.
+
+    Backends without RETURNING (SQLite) do not set ids in bulk_create.
+    The transaction holds the write lock, so the newest rows of the
+    author are the inserted ones.
+    """
+    model.objects.bulk_create(objects, batch_size=settings.API_BULK_BATCH)
+    if objects and objects[0].pk is None:
+        ids = model.objects.filter(author=author).order_by(
+            '-id').values_list('id', flat=True)[:len(objects)]
+        for obj, pk in zip(objects, reversed(ids)):
+            obj.pk = pk
+    return objects
+
+
+def bulk_results(items, valid, errors):
+    """Per-item results in the order of the request."""
+    results = [None] * len(items)
+    for index, obj in valid:
+        results[index] = {'index': index, 'id': obj.pk}
+    for index, error in errors:
+        results[index] = {'index': index, 'errors': error}
+    return {
+        'created': len(valid),
+        'failed': len(errors),
+        'results': results,
+    }
+
+
+@api_write_view
+def bulk_posts(request, user):
+    """Create posts validated like PostForm, items: {"text", "group"}."""
+    items = bulk_items(request)
+    valid, errors = [], []
+    for index, item in enumerate(items):
+        form = PostForm(data=item)
+        if form.is_valid():
+            post = form.save(commit=False)
+            post.author = user
+            valid.append((index, post))
+        else:
+            errors.append((index, form.errors.get_json_data()))
+    with transaction.atomic():
+        bulk_insert(Post, [post for _, post in valid], user)
+        if valid:
+            posts_created(user, [post for _, post in valid])
+    return bulk_results(items, valid, errors)
+
+
+@api_write_view
+def bulk_comments(request, user):
+    """Create comments validated like CommentForm, items: {"post", "text"}."""
+    items = bulk_items(request)
+    # bool is an int subclass, true is not a post id
+    malformed = [
+        {'index': index, 'errors': {'post': [
+            {'message': 'Post id must be an integer', 'code': 'invalid'}]}}
+        for index, item in enumerate(items)
+        if type(item.get('post')) is not int
+    ]
+    if malformed:
+        raise ApiError('Invalid items', errors=malformed)
+    post_ids = set(queries.feed().filter(
+        id__in=[item['post'] for item in items]
+    ).values_list('id', flat=True))
+    valid, errors = [], []
+    for index, item in enumerate(items):
+        form = CommentForm(data=item)
+        if item.get('post') not in post_ids:
+            errors.append(
+                (index, {'post': [{'message': 'Unknown post',
+                                   'code': 'invalid'}]}))
+        elif form.is_valid():
+            comment = form.save(commit=False)
+            comment.author = user
+            comment.post_id = item['post']
+            valid.append((index, comment))
+        else:
+            errors.append((index, form.errors.get_json_data()))
+    with transaction.atomic():
+        bulk_insert(Comment, [comment for _, comment in valid], user)
+        bump(*{('post', comment.post_id) for _, comment in valid})
+    for _, comment in valid:
+        trending.record(comment.post_id, settings.TRENDING_COMMENT_WEIGHT)
+    return bulk_results(items, valid, errors)
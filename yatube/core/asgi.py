@@ -0,0 +1,198 @@
+import asyncio
+import sys
+from contextlib import suppress
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+import django
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+
+
+def wsgi_environ(scope, body):
+    """Build WSGI environ of the request from the ASGI scope."""
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', ''),
+        # WSGI keeps the path as bytes decoded with latin-1
+        'PATH_INFO': scope['path'].encode().decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': str(server[0]),
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': 'HTTP/' + scope.get('http_version', '1.1'),
+        'REMOTE_ADDR': str(client[0]),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name not in ('CONTENT_LENGTH', 'CONTENT_TYPE'):
+            name = 'HTTP_' + name
+        if name in environ:
+            value = environ[name] + ',' + value
+        environ[name] = value
+    return environ
+
+
+class ASGIHandler:
+    """ASGI 3 application serving Django 2.2 from a bounded thread pool.
+
+    Django 2.2 can not run views in the event loop, so the loop keeps
+    connections: idle keep-alive and slow clients cost no thread, one is
+    taken only while a view builds the response or the next chunk of a
+    streamed body. Responses with async_streaming_content are streamed
+    by the loop itself.
+    """
+
+    def __init__(self, threads=None):
+        self.wsgi = WSGIHandler()
+        self.executor = ThreadPoolExecutor(
+            max_workers=threads or settings.ASGI_THREADS,
+            thread_name_prefix='asgi',
+        )
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+        if scope['type'] != 'http':
+            raise ValueError(f'Unsupported scope type {scope["type"]}')
+        body = await self.read_body(receive)
+        if body is None:
+            return
+        loop = asyncio.get_event_loop()
+        status, headers, response = await loop.run_in_executor(
+            self.executor, self.get_response, wsgi_environ(scope, body)
+        )
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': headers,
+        })
+        if isinstance(response, bytes):
+            await send({'type': 'http.response.body', 'body': response})
+            return
+        chunks = getattr(response, 'async_streaming_content', None)
+        try:
+            if chunks is not None:
+                await self.stream_async(chunks, receive, send)
+            else:
+                await self.stream(response, receive, send)
+        finally:
+            await loop.run_in_executor(self.executor, response.close)
+
+    @staticmethod
+    async def read_body(receive):
+        """Whole request body, None if the client went away."""
+        chunks = []
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return None
+            chunks.append(message.get('body', b''))
+            if not message.get('more_body', False):
+                return b''.join(chunks)
+
+    def get_response(self, environ):
+        """Run the view, a body that is not streamed is read at once.
+
+        The response is closed in the same thread then, so Django closes
+        the database connection of the thread that used it.
+        """
+        started = {}
+
+        def start_response(status, headers, exc_info=None):
+            started['status'] = int(status.split(' ', 1)[0])
+            started['headers'] = [
+                (name.lower().encode('latin-1'), value.encode('latin-1'))
+                for name, value in headers
+            ]
+
+        response = self.wsgi(environ, start_response)
+        if not getattr(response, 'streaming', False):
+            body = response.content
+            response.close()
+            response = body
+        return started['status'], started['headers'], response
+
+    async def stream(self, response, receive, send):
+        """Send chunks of a streaming response until the client leaves."""
+        loop = asyncio.get_event_loop()
+        chunks = iter(response)
+        disconnect = asyncio.ensure_future(receive())
+        try:
+            while True:
+                chunk = loop.run_in_executor(self.executor, next, chunks, None)
+                done, _ = await asyncio.wait(
+                    {chunk, disconnect},
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                if disconnect in done:
+                    return
+                chunk = chunk.result()
+                if chunk is None:
+                    break
+                await send({
+                    'type': 'http.response.body',
+                    'body': chunk,
+                    'more_body': True,
+                })
+            await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            disconnect.cancel()
+
+    async def stream_async(self, chunks, receive, send):
+        """Send chunks of an async iterator made in the event loop.
+
+        Streams waiting for events this way, like Server-Sent Events,
+        hold no thread of the pool.
+        """
+        disconnect = asyncio.ensure_future(receive())
+        try:
+            while True:
+                chunk = asyncio.ensure_future(chunks.__anext__())
+                done, _ = await asyncio.wait(
+                    {chunk, disconnect},
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                if disconnect in done:
+                    chunk.cancel()
+                    with suppress(asyncio.CancelledError):
+                        await chunk
+                    return
+                try:
+                    body = chunk.result()
+                except StopAsyncIteration:
+                    break
+                await send({
+                    'type': 'http.response.body',
+                    'body': body,
+                    'more_body': True,
+                })
+            await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            disconnect.cancel()
+            await chunks.aclose()
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+
+def get_asgi_application():
+    """Counterpart of django.core.wsgi.get_wsgi_application."""
+    django.setup(set_prefix=False)
+    return ASGIHandler()
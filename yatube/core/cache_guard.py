@@ -0,0 +1,88 @@
+import math
+import random
+import time
+
+from django.core.cache import cache as default_cache
+
+# Seconds a filler may hold the lock of a key
+LOCK_TIMEOUT = 10
+# Stale values are kept this many timeouts longer to be served while
+# a single request refreshes them
+STALE_FACTOR = 2
+# Probabilistic early refresh, bigger values refresh earlier
+BETA = 1.0
+WAIT_STEP = 0.01
+
+
+def now():
+    return time.time()
+
+
+def is_fresh(entry, beta=BETA):
+    """Decide whether the value can be served without refresh.
+
+    Besides the timeout the check refreshes early with a chance that
+    grows as expiry approaches and with the time the value takes to
+    compute (XFetch), so refreshes of popular keys spread out in time.
+    """
+    early = entry['delta'] * beta * math.log(1 - random.random())
+    return now() - early < entry['expires']
+
+
+def guarded_get(key, fill, timeout, cache=None):
+    """Return the cached value of the key, filling it at most once.
+
+    Only the request that takes the lock of the key calls ``fill``,
+    others get the stale value meanwhile or wait for the new one
+    when there is nothing to serve. ``fill`` may return None to skip
+    caching, the None is still stored stale for a while, so waiters
+    get it instead of filling the key again.
+    """
+    cache = cache or default_cache
+    entry = seen = cache.get(key)
+    if entry is not None and is_fresh(entry):
+        return entry['value']
+    lock_key = f'{key}:lock'
+    deadline = now() + LOCK_TIMEOUT
+    while True:
+        if cache.add(lock_key, True, LOCK_TIMEOUT):
+            try:
+                # Another request may have filled the key just before
+                entry = cache.get(key)
+                if is_newer(entry, seen):
+                    return entry['value']
+                return _fill(key, fill, timeout, cache)
+            finally:
+                cache.delete(lock_key)
+        if entry is not None:
+            return entry['value']
+        if now() >= deadline:
+            return _fill(key, fill, timeout, cache)
+        time.sleep(WAIT_STEP)
+        entry = cache.get(key)
+
+
+def is_newer(entry, seen):
+    """Whether entry was filled after the seen one."""
+    if entry is None:
+        return False
+    return seen is None or entry['expires'] != seen['expires']
+
+
+def _fill(key, fill, timeout, cache):
+    start = now()
+    value = fill()
+    finish = now()
+    if value is None:
+        # Stale at once, kept only to answer requests waiting for it
+        entry = {'value': None, 'expires': finish, 'delta': finish - start}
+        cache.set(key, entry, LOCK_TIMEOUT)
+        return value
+    forever = timeout is None
+    entry = {
+        'value': value,
+        'expires': math.inf if forever else finish + timeout,
+        'delta': finish - start,
+    }
+    cache.set(key, entry, None if forever else timeout * STALE_FACTOR)
+    return value
@@ -0,0 +1,118 @@
+import gzip
+import re
+import struct
+import zlib
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+
+from core.holes import fixed_parts
+from core.static import accepted_encodings
+from core.storage import COMPRESSIBLE_TYPES
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Header of a gzip member without a name and time, from an unknown OS
+GZIP_HEADER = b'\x1f\x8b\x08\x00\x00\x00\x00\x00\x00\xff'
+# Empty final deflate block
+FINAL_BLOCK = b'\x03\x00'
+
+
+def level(encoding, size):
+    """Compression level for a body of size bytes.
+
+    Small bodies are compressed hard, big ones faster (see
+    COMPRESSION_LEVELS).
+    """
+    for max_size, result in settings.COMPRESSION_LEVELS[encoding]:
+        if max_size is None or size <= max_size:
+            return result
+
+
+def deflate(data, compress_level):
+    """Raw deflate blocks which may be followed by any other blocks.
+
+    A full flush ends them on a byte boundary without references to
+    earlier data, so separately compressed parts join into one stream.
+    """
+    compressor = zlib.compressobj(
+        compress_level, zlib.DEFLATED, -zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush(zlib.Z_FULL_FLUSH)
+
+
+def deflate_page(content):
+    """Compressed fixed parts of a cached page, made once per entry."""
+    return [deflate(part, 9) for part in fixed_parts(content)]
+
+
+def gzip_page(parts, deflated):
+    """Gzip of a page from its compressed fixed parts and fresh fragments.
+
+    Only the fragments are compressed, parts are those of holes.fill.
+    """
+    chunks = [GZIP_HEADER]
+    crc = size = 0
+    for index, part in enumerate(parts):
+        if index % 2:
+            chunks.append(deflate(part, level('gzip', len(part))))
+        else:
+            chunks.append(deflated[index // 2])
+        crc = zlib.crc32(part, crc)
+        size += len(part)
+    chunks.append(FINAL_BLOCK)
+    chunks.append(struct.pack('<II', crc, size & 0xffffffff))
+    return b''.join(chunks)
+
+
+def is_compressible(response):
+    content_type = response.get('Content-Type', '').split(';')[0].strip()
+    return (
+        content_type.startswith('text/')
+        or content_type in COMPRESSIBLE_TYPES
+    )
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """Compress responses with brotli or gzip.
+
+    Pages from posts.caching.cached_page carry the fixed parts of the
+    cached entry compressed in advance (response.precompressed) and are
+    sent in gzip, compressing only the per-user fragments. Brotli needs
+    the optional brotli package.
+    """
+
+    def process_response(self, request, response):
+        if (
+            response.streaming
+            or response.has_header('Content-Encoding')
+            or len(response.content) < settings.COMPRESSION_MIN_SIZE
+            or not is_compressible(response)
+        ):
+            return response
+        patch_vary_headers(response, ('Accept-Encoding',))
+        accepted = accepted_encodings(request)
+        content = response.content
+        precompressed = getattr(response, 'precompressed', None)
+        if precompressed is not None and 'gzip' in accepted:
+            encoding, body = 'gzip', gzip_page(*precompressed)
+        elif brotli is not None and 'br' in accepted:
+            encoding, body = 'br', brotli.compress(
+                content, quality=level('br', len(content)))
+        elif 'gzip' in accepted:
+            encoding, body = 'gzip', gzip.compress(
+                content, level('gzip', len(content)), mtime=0)
+        else:
+            return response
+        if len(body) >= len(content):
+            return response
+        response.content = body
+        response['Content-Length'] = str(len(body))
+        response['Content-Encoding'] = encoding
+        # The body differs from the uncompressed one the ETag was made for
+        if response.has_header('ETag'):
+            response['ETag'] = re.sub(r'^"', 'W/"', response['ETag'])
+        return response
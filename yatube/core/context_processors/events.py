@@ -0,0 +1,8 @@
+from django.conf import settings
+
+
+def events(request):
+    """Включает живые обновления лент, если сервер их поддерживает."""
+    return {
+        'events_enabled': settings.EVENTS_ENABLED,
+    }
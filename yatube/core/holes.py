@@ -0,0 +1,65 @@
+import base64
+import json
+import re
+
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+HOLE_MARKER = '<!--hole:{}-->'
+HOLE_PATTERN = re.compile(rb'<!--hole:([A-Za-z0-9_=-]+)-->')
+
+_providers = {}
+
+
+def hole_context(template_name):
+    """Register a function that builds the per-user context of a hole."""
+    def decorator(func):
+        _providers[template_name] = func
+        return func
+    return decorator
+
+
+def hole_marker(template_name, kwargs):
+    """Marker stored in the cached page instead of a per-user fragment."""
+    payload = json.dumps([template_name, kwargs], separators=(',', ':'))
+    token = base64.urlsafe_b64encode(payload.encode()).decode()
+    return mark_safe(HOLE_MARKER.format(token))
+
+
+def hole_context_for(request, template_name, kwargs):
+    """Context of a fragment for the user of the request."""
+    context = dict(kwargs)
+    provider = _providers.get(template_name)
+    if provider is not None:
+        context.update(provider(request, **kwargs))
+    return context
+
+
+def render_hole(request, template_name, kwargs):
+    """Render a fragment for the user of the request."""
+    context = hole_context_for(request, template_name, kwargs)
+    return render_to_string(template_name, context, request=request)
+
+
+def fill(content, request):
+    """Parts of a cached page, fragments of the current user in holes.
+
+    Fixed parts of the page are at even indexes, fragments at odd ones.
+    """
+    parts = HOLE_PATTERN.split(content)
+    for index in range(1, len(parts), 2):
+        template_name, kwargs = json.loads(
+            base64.urlsafe_b64decode(parts[index])
+        )
+        parts[index] = render_hole(request, template_name, kwargs).encode()
+    return parts
+
+
+def fixed_parts(content):
+    """Parts of a cached page around its holes."""
+    return HOLE_PATTERN.split(content)[::2]
+
+
+def punch(content, request):
+    """Fill holes of a cached page with fragments of the current user."""
+    return b''.join(fill(content, request))
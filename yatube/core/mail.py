@@ -0,0 +1,153 @@
+import atexit
+import heapq
+import itertools
+import logging
+import queue
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.mail import get_connection
+from django.core.mail.backends.base import BaseEmailBackend
+
+logger = logging.getLogger(__name__)
+
+
+class MailQueue:
+    """Outgoing mail sent by a worker thread of the process.
+
+    The worker takes up to MAIL_QUEUE_BATCH messages and sends them over
+    one connection of MAIL_QUEUE_BACKEND. A message that fails is tried
+    again after MAIL_QUEUE_BACKOFF seconds, doubled on each attempt, at
+    most MAIL_QUEUE_RETRIES times.
+    """
+
+    def __init__(self):
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.retries = []
+        self.order = itertools.count()
+        self.counters = Counter()
+        self.pending = 0
+        self.thread = None
+
+    def put(self, messages):
+        with self.lock:
+            self.pending += len(messages)
+            self.counters['queued'] += len(messages)
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(
+                    target=self.run, name='mail-queue', daemon=True)
+                self.thread.start()
+        for message in messages:
+            self.queue.put((message, 0))
+
+    def next_batch(self):
+        """Messages due now, waiting for the first one or a retry."""
+        with self.lock:
+            timeout = None
+            if self.retries:
+                timeout = max(0, self.retries[0][0] - time.monotonic())
+        batch = []
+        try:
+            batch.append(self.queue.get(timeout=timeout))
+        except queue.Empty:
+            pass
+        while len(batch) < settings.MAIL_QUEUE_BATCH:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        now = time.monotonic()
+        with self.lock:
+            while (
+                self.retries and self.retries[0][0] <= now
+                and len(batch) < settings.MAIL_QUEUE_BATCH
+            ):
+                batch.append(heapq.heappop(self.retries)[2])
+        return batch
+
+    def run(self):
+        while True:
+            batch = self.next_batch()
+            if batch:
+                self.send(batch)
+
+    def send(self, batch):
+        connection = get_connection(settings.MAIL_QUEUE_BACKEND)
+        try:
+            connection.open()
+        except Exception:
+            logger.exception('Cannot connect to send mail')
+            for item in batch:
+                self.failed(*item)
+            return
+        try:
+            for message, attempt in batch:
+                try:
+                    connection.send_messages([message])
+                except Exception:
+                    logger.exception('Cannot send mail to %s', message.to)
+                    self.failed(message, attempt)
+                else:
+                    self.done('sent')
+        finally:
+            connection.close()
+
+    def failed(self, message, attempt):
+        if attempt >= settings.MAIL_QUEUE_RETRIES:
+            self.done('failed')
+            return
+        delay = settings.MAIL_QUEUE_BACKOFF * 2 ** attempt
+        with self.lock:
+            self.counters['retried'] += 1
+            heapq.heappush(self.retries, (
+                time.monotonic() + delay,
+                next(self.order),
+                (message, attempt + 1),
+            ))
+
+    def done(self, result):
+        with self.lock:
+            self.counters[result] += 1
+            self.pending -= 1
+
+    def stats(self):
+        """Depth of the queue and totals since start."""
+        with self.lock:
+            return {
+                'depth': self.pending,
+                'waiting_retry': len(self.retries),
+                'queued': self.counters['queued'],
+                'sent': self.counters['sent'],
+                'retried': self.counters['retried'],
+                'failed': self.counters['failed'],
+            }
+
+    def drain(self, timeout):
+        """Wait for the queued mail to be sent, True if it was."""
+        deadline = time.monotonic() + timeout
+        while self.pending and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return not self.pending
+
+
+mail_queue = MailQueue()
+
+
+class QueuedEmailBackend(BaseEmailBackend):
+    """Put messages to the mail queue and return at once."""
+
+    def send_messages(self, email_messages):
+        if not email_messages:
+            return 0
+        mail_queue.put(list(email_messages))
+        return len(email_messages)
+
+
+@atexit.register
+def _drain_on_exit():
+    # Mail queued just before a clean shutdown is still sent
+    if mail_queue.pending:
+        mail_queue.drain(settings.MAIL_QUEUE_SHUTDOWN_TIMEOUT)
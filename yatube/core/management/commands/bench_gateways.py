@@ -0,0 +1,92 @@
+import asyncio
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+
+from core.asgi import ASGIHandler, wsgi_environ
+
+
+def scope_for(path):
+    path, _, query = path.partition('?')
+    return {
+        'type': 'http',
+        'http_version': '1.1',
+        'method': 'GET',
+        'scheme': 'http',
+        'path': path,
+        'query_string': query.encode(),
+        'headers': [(b'host', b'localhost')],
+        'server': ('localhost', 80),
+        'client': ('127.0.0.1', 50000),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare throughput of the WSGI and ASGI entry points with an '
+        'in-process load generator. WSGI gets as many threads as there '
+        'are concurrent clients, ASGI serves them from ASGI_THREADS.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default='/')
+        parser.add_argument('--requests', type=int, default=1000)
+        parser.add_argument('--concurrency', type=int, default=50)
+
+    def handle(self, *args, **options):
+        scope = scope_for(options['path'])
+        for name, bench in (('WSGI', self.bench_wsgi),
+                            ('ASGI', self.bench_asgi)):
+            start = time.perf_counter()
+            statuses = bench(scope, options['requests'],
+                             options['concurrency'])
+            elapsed = time.perf_counter() - start
+            self.stdout.write(
+                f'{name}: {options["requests"] / elapsed:.0f} req/s, '
+                f'{elapsed:.2f} s, statuses {dict(statuses)}'
+            )
+
+    @staticmethod
+    def bench_wsgi(scope, requests, concurrency):
+        application = WSGIHandler()
+
+        def request(_):
+            started = []
+            response = application(
+                wsgi_environ(scope, b''),
+                lambda status, headers, exc_info=None: started.append(status),
+            )
+            b''.join(response)
+            response.close()
+            return int(started[0].split()[0])
+
+        with ThreadPoolExecutor(concurrency) as executor:
+            return Counter(executor.map(request, range(requests)))
+
+    @staticmethod
+    def bench_asgi(scope, requests, concurrency):
+        application = ASGIHandler()
+
+        async def request(limit):
+            async with limit:
+                messages = []
+
+                async def receive():
+                    return {'type': 'http.request', 'body': b''}
+
+                async def send(message):
+                    messages.append(message)
+
+                await application(scope, receive, send)
+                return messages[0]['status']
+
+        async def run():
+            limit = asyncio.Semaphore(concurrency)
+            return Counter(await asyncio.gather(
+                *(request(limit) for _ in range(requests))
+            ))
+
+        return asyncio.run(run())
@@ -0,0 +1,131 @@
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_etags, quote_etag
+
+RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class FileRange:
+    """Part of an open file, read from its current offset.
+
+    Exposes fileno() so wsgi.file_wrapper can still send it with
+    sendfile starting from the offset for Content-Length bytes.
+    """
+
+    def __init__(self, file, start, length):
+        file.seek(start)
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+def byte_range(header, size):
+    """(start, end) of a single Range, None for the whole file.
+
+    Raises ValueError when the range cannot be satisfied.
+    """
+    match = RANGE.match(header.replace(' ', ''))
+    if match is None:
+        # Multiple and malformed ranges are answered with the whole file
+        return None
+    first, last = match.groups()
+    if not first:
+        if not last:
+            return None
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    if start > end or start >= size:
+        raise ValueError(header)
+    return start, end
+
+
+def accel_response(name, path):
+    """Leave sending the file to the front server."""
+    response = HttpResponse()
+    if settings.MEDIA_ACCEL == 'x-accel-redirect':
+        response['X-Accel-Redirect'] = quote(
+            settings.MEDIA_ACCEL_PREFIX + name)
+    else:
+        response['X-Sendfile'] = path
+    # The front server sets the type of the file it sends
+    del response['Content-Type']
+    return response
+
+
+def file_response(request, fullpath, size, etag):
+    """FileResponse with the whole file or the requested range of it."""
+    content_type, _ = mimetypes.guess_type(fullpath)
+    content_type = content_type or 'application/octet-stream'
+    if_range = request.META.get('HTTP_IF_RANGE')
+    try:
+        requested = byte_range(request.META.get('HTTP_RANGE', ''), size)
+    except ValueError:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+    if if_range and etag not in parse_etags(if_range):
+        # The client has another version, send the whole of this one
+        requested = None
+    file = open(fullpath, 'rb')
+    if requested is None:
+        response = FileResponse(file, content_type=content_type)
+        response['Content-Length'] = size
+    else:
+        start, end = requested
+        response = FileResponse(
+            FileRange(file, start, end - start + 1),
+            content_type=content_type, status=206,
+        )
+        response['Content-Length'] = end - start + 1
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    response['Accept-Ranges'] = 'bytes'
+    return response
+
+
+def serve(request, path):
+    """Uploaded file with ETag, ranges and a long cache lifetime.
+
+    With MEDIA_ACCEL the front server sends the file named in an
+    X-Accel-Redirect (nginx) or X-Sendfile (Apache, lighttpd) header.
+    """
+    try:
+        fullpath = safe_join(settings.MEDIA_ROOT, path)
+        stat = os.stat(fullpath)
+    except (SuspiciousFileOperation, OSError):
+        raise Http404(path)
+    if not os.path.isfile(fullpath):
+        raise Http404(path)
+    etag = quote_etag(f'{stat.st_mtime_ns:x}-{stat.st_size:x}')
+    response = get_conditional_response(
+        request, etag=etag, last_modified=int(stat.st_mtime))
+    if response is None:
+        if settings.MEDIA_ACCEL:
+            response = accel_response(path, fullpath)
+        else:
+            response = file_response(request, fullpath, stat.st_size, etag)
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    response['Cache-Control'] = f'public, max-age={settings.MEDIA_MAX_AGE}'
+    return response
@@ -0,0 +1,170 @@
+import asyncio
+import atexit
+import json
+import os
+import queue
+import socket
+import threading
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+class Subscription:
+    """Queue of events accepted by the predicate."""
+
+    def __init__(self, broker, predicate):
+        self.broker = broker
+        self.predicate = predicate
+        self.events = queue.Queue(maxsize=settings.EVENTS_QUEUE_SIZE)
+
+    def put(self, event):
+        """Queue the event, a slow reader with a full queue misses it."""
+        try:
+            self.events.put_nowait(event)
+        except queue.Full:
+            pass
+
+    def get(self, timeout):
+        """Next event or None when nothing came within the timeout."""
+        try:
+            return self.events.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class AsyncSubscription(Subscription):
+    """Subscription read in an event loop, waiting takes no thread."""
+
+    def __init__(self, broker, predicate, loop):
+        self.broker = broker
+        self.predicate = predicate
+        self.loop = loop
+        self.events = asyncio.Queue(maxsize=settings.EVENTS_QUEUE_SIZE)
+
+    def put(self, event):
+        try:
+            self.loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:
+            # The loop is closed, the subscription goes away with it
+            pass
+
+    def _put(self, event):
+        try:
+            self.events.put_nowait(event)
+        except asyncio.QueueFull:
+            pass
+
+    async def get(self, timeout):
+        try:
+            return await asyncio.wait_for(self.events.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class LocalBroker:
+    """Publish-subscribe within the process."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscriptions = set()
+
+    def subscribe(self, predicate=None, loop=None):
+        """Subscription to events, read in the loop when one is given."""
+        predicate = predicate or (lambda event: True)
+        if loop is None:
+            subscription = Subscription(self, predicate)
+        else:
+            subscription = AsyncSubscription(self, predicate, loop)
+        with self.lock:
+            self.subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            self.subscriptions.discard(subscription)
+
+    def publish(self, event):
+        self.deliver(event)
+
+    def deliver(self, event):
+        """Put the event to queues of the matching subscriptions.
+
+        A slow reader with a full queue misses the event instead of
+        blocking the publisher.
+        """
+        with self.lock:
+            subscriptions = list(self.subscriptions)
+        for subscription in subscriptions:
+            if subscription.predicate(event):
+                subscription.put(event)
+
+
+class SocketBroker(LocalBroker):
+    """Publish-subscribe between processes of one host.
+
+    Every process binds a Unix datagram socket in EVENTS_SOCKET_DIR,
+    events are sent to all of them. A stand-in for a network broker.
+    """
+
+    def __init__(self, directory=None):
+        super().__init__()
+        self.directory = directory or settings.EVENTS_SOCKET_DIR
+        os.makedirs(self.directory, exist_ok=True)
+        self.path = os.path.join(self.directory, f'{os.getpid()}.sock')
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.socket.bind(self.path)
+        threading.Thread(
+            target=self.listen, name='events-broker', daemon=True
+        ).start()
+        atexit.register(self.close)
+
+    def publish(self, event):
+        data = json.dumps(event).encode()
+        sender = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        with sender:
+            for name in os.listdir(self.directory):
+                if not name.endswith('.sock'):
+                    continue
+                path = os.path.join(self.directory, name)
+                try:
+                    sender.sendto(data, path)
+                except (ConnectionRefusedError, FileNotFoundError):
+                    # Socket of a process that is gone
+                    try:
+                        os.unlink(path)
+                    except FileNotFoundError:
+                        pass
+
+    def listen(self):
+        while True:
+            try:
+                data = self.socket.recv(settings.EVENTS_MAX_SIZE)
+            except OSError:
+                return
+            self.deliver(json.loads(data))
+
+    def close(self):
+        self.socket.close()
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    """Broker of the process, class is set by EVENTS_BROKER."""
+    global _broker
+    with _broker_lock:
+        if _broker is None:
+            _broker = import_string(settings.EVENTS_BROKER)()
+        return _broker
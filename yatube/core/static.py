@@ -0,0 +1,107 @@
+import json
+import mimetypes
+import os
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed, SuspiciousFileOperation
+from django.http import FileResponse, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+
+# Suffixes of compressed variants by Content-Encoding, best first
+ENCODINGS = [('br', '.br'), ('gzip', '.gz')]
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+
+def accepted_encodings(request):
+    """Content codings the client accepts, q=0 ones left out."""
+    accepted = set()
+    for part in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        coding, _, params = part.partition(';')
+        if params.replace(' ', '') in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            continue
+        accepted.add(coding.strip().lower())
+    return accepted
+
+
+def serve_file(request, root, name, cache_control):
+    """Response with the file under root, None if there is none.
+
+    A compressed variant next to the file is sent to clients accepting
+    it. FileResponse lets the WSGI server send the file with sendfile.
+    """
+    try:
+        path = safe_join(root, name)
+    except SuspiciousFileOperation:
+        return None
+    if not os.path.isfile(path):
+        return None
+    content_type, _ = mimetypes.guess_type(path)
+    accepted = accepted_encodings(request)
+    served, content_encoding, has_variants = path, None, False
+    for encoding, suffix in ENCODINGS:
+        if os.path.isfile(path + suffix):
+            has_variants = True
+            if content_encoding is None and encoding in accepted:
+                served, content_encoding = path + suffix, encoding
+    stat = os.stat(served)
+    if not was_modified_since(
+        request.META.get('HTTP_IF_MODIFIED_SINCE'),
+        stat.st_mtime, stat.st_size,
+    ):
+        response = HttpResponseNotModified()
+    else:
+        response = FileResponse(
+            open(served, 'rb'),
+            content_type=content_type or 'application/octet-stream',
+        )
+        response['Content-Length'] = stat.st_size
+        if content_encoding:
+            response['Content-Encoding'] = content_encoding
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    response['Cache-Control'] = cache_control
+    if has_variants:
+        patch_vary_headers(response, ['Accept-Encoding'])
+    return response
+
+
+def hashed_names(root):
+    """Names with content hashes from the manifest of collectstatic."""
+    try:
+        with open(os.path.join(root, 'staticfiles.json')) as manifest:
+            return set(json.load(manifest)['paths'].values())
+    except (OSError, ValueError, KeyError):
+        return set()
+
+
+class StaticFilesMiddleware:
+    """Serve collected static files when there is no proxy in front.
+
+    Hashed names never change and are cached by browsers for a year,
+    the rest for STATIC_MAX_AGE seconds.
+    """
+
+    def __init__(self, get_response):
+        if not settings.STATIC_SERVE:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.prefix = settings.STATIC_URL
+        self.root = settings.STATIC_ROOT
+        self.hashed = hashed_names(self.root)
+
+    def __call__(self, request):
+        if (
+            request.method in ('GET', 'HEAD')
+            and request.path_info.startswith(self.prefix)
+        ):
+            name = request.path_info[len(self.prefix):]
+            cache_control = (
+                IMMUTABLE if name in self.hashed
+                else f'public, max-age={settings.STATIC_MAX_AGE}'
+            )
+            response = serve_file(request, self.root, name, cache_control)
+            if response is not None:
+                return response
+        return self.get_response(request)
@@ -0,0 +1,104 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+import posixpath
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile, File
+from django.core.files.storage import FileSystemStorage
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_TYPES = {
+    'application/javascript',
+    'application/json',
+    'application/xml',
+    'image/svg+xml',
+}
+
+
+def compressors():
+    """Suffixes of compressed variants and functions making them."""
+    result = [('.gz', lambda data: gzip.compress(data, 9, mtime=0))]
+    if brotli is not None:
+        result.insert(0, ('.br', brotli.compress))
+    return result
+
+
+def is_compressible(name):
+    content_type, encoding = mimetypes.guess_type(name)
+    return encoding is None and content_type is not None and (
+        content_type.startswith('text/')
+        or content_type in COMPRESSIBLE_TYPES
+    )
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """Hashed names plus .br and .gz variants made by collectstatic.
+
+    Brotli variants need the optional brotli package. A variant is kept
+    only when it is smaller than the file by STATIC_COMPRESS_MIN_SAVING.
+    """
+
+    def post_process(self, paths, dry_run=False, **options):
+        # Files referring to others are processed in several passes,
+        # they are compressed once their final content is saved
+        final = {}
+        for name, hashed_name, processed in super().post_process(
+            paths, dry_run, **options
+        ):
+            if not isinstance(processed, Exception):
+                final[name] = hashed_name
+            yield name, hashed_name, processed
+        for name, hashed_name in final.items():
+            for path in {name, hashed_name}:
+                self.compress(path)
+
+    def compress(self, name):
+        if not is_compressible(name) or not self.exists(name):
+            return
+        with self.open(name) as original:
+            data = original.read()
+        if len(data) < settings.STATIC_COMPRESS_MIN_SIZE:
+            return
+        for suffix, compress in compressors():
+            compressed = compress(data)
+            if len(compressed) > len(data) * (
+                1 - settings.STATIC_COMPRESS_MIN_SAVING
+            ):
+                continue
+            if self.exists(name + suffix):
+                self.delete(name + suffix)
+            self._save(name + suffix, ContentFile(compressed))
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """Files named by the SHA-256 of their content.
+
+    Identical uploads share one file, hashed while it is read in chunks.
+    sorl-thumbnail keys thumbnails by the source name, so they share
+    thumbnails as well.
+    """
+
+    def save(self, name, content, max_length=None):
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        digest = digest.hexdigest()
+        directory, filename = posixpath.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        name = posixpath.join(directory, digest[:2], digest[2:] + extension)
+        try:
+            # Fresh files are kept until the post is saved
+            os.utime(self.path(name))
+        except FileNotFoundError:
+            return super().save(name, content, max_length)
+        return name
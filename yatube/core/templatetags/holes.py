@@ -0,0 +1,21 @@
+from django import template
+
+from core.holes import hole_context_for, hole_marker
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def hole(context, template_name, **kwargs):
+    """Include a per-user fragment.
+
+    Pages rendered for the shared page cache get a marker instead,
+    it is filled for every user when the page is served.
+    """
+    request = context.get('request')
+    if getattr(request, 'punch_holes', False):
+        return hole_marker(template_name, kwargs)
+    fragment = context.template.engine.get_template(template_name)
+    extra = hole_context_for(request, template_name, kwargs)
+    with context.push(**extra):
+        return fragment.render(context)
@@ -1,6 +1,64 @@
+import asyncio
+import gzip
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
 from http import HTTPStatus
 
-from django.test import Client, TestCase
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.cache import cache
+from django.core.mail.backends.locmem import EmailBackend
+from django.core.management import call_command
+from django.template import engines
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.urls import reverse
+
+from core.asgi import ASGIHandler
+from core.compression import deflate_page, gzip_page
+from core.holes import fill, hole_marker
+from core.mail import MailQueue, mail_queue
+from core.warmup import template_names, warm_templates
+from core.static import StaticFilesMiddleware
+from posts.models import Post
+
+FIRST_REQUEST_SCRIPT = '''
+import json, os, sys
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+from django.conf import settings
+settings.DATABASES['default']['NAME'] = ':memory:'
+import django
+django.setup()
+from django.core.management import call_command
+from django.template import engines
+from django.test import Client
+from core.warmup import warm_templates
+call_command('migrate', verbosity=0)
+if sys.argv[1] == 'warm':
+    warm_templates()
+loader = engines['django'].engine.template_loaders[0]
+compiled = len(loader.get_template_cache)
+response = Client().get('/')
+print(json.dumps({
+    'status': response.status_code,
+    'parsed_on_request': len(loader.get_template_cache) - compiled,
+}))
+'''
+
+
+def first_request(mode):
+    """Run the first request to index in a fresh production process."""
+    env = dict(os.environ, DEBUG='False', STATIC_PIPELINE='0')
+    output = subprocess.check_output(
+        [sys.executable, '-c', FIRST_REQUEST_SCRIPT, mode],
+        cwd=settings.BASE_DIR,
+        env=env,
+    )
+    return json.loads(output.decode().strip().splitlines()[-1])
 
 
 class ViewTestClass(TestCase):
@@ -12,3 +70,348 @@ class ViewTestClass(TestCase):
         response = self.client.get('/nonexist-page/')
         self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
         self.assertTemplateUsed(response, 'core/404.html')
+
+
+class WarmTemplatesTest(TestCase):
+    def test_cached_loader_is_populated(self):
+        """All project templates are compiled into the cached loader."""
+        templates = [dict(settings.TEMPLATES[0])]
+        templates[0]['OPTIONS'] = dict(
+            templates[0]['OPTIONS'],
+            loaders=[('django.template.loaders.cached.Loader', [
+                'django.template.loaders.filesystem.Loader',
+                'django.template.loaders.app_directories.Loader',
+            ])],
+        )
+        with self.settings(TEMPLATES=templates):
+            loader = engines['django'].engine.template_loaders[0]
+            self.assertEqual(loader.get_template_cache, {})
+            count = warm_templates()
+            cached = set(loader.get_template_cache)
+        self.assertGreater(count, 0)
+        self.assertEqual(count, len(cached))
+        for name in template_names():
+            with self.subTest(name=name):
+                self.assertIn(name, cached)
+
+    def test_first_request_parses_nothing(self):
+        """Warmed worker serves the first index without parsing templates."""
+        cold = first_request('cold')
+        warm = first_request('warm')
+        self.assertEqual(cold['status'], HTTPStatus.OK)
+        self.assertEqual(warm['status'], HTTPStatus.OK)
+        self.assertGreater(cold['parsed_on_request'], 0)
+        self.assertEqual(warm['parsed_on_request'], 0)
+
+
+class AsgiHandlerTest(TestCase):
+    def request(self, path, method='GET', body=b''):
+        messages = []
+        incoming = [{'type': 'http.request', 'body': body}]
+
+        async def receive():
+            if incoming:
+                return incoming.pop()
+            await asyncio.sleep(3600)
+
+        async def send(message):
+            messages.append(message)
+
+        scope = {
+            'type': 'http',
+            'method': method,
+            'path': path,
+            'query_string': b'',
+            'headers': [(b'host', b'localhost')],
+        }
+        asyncio.run(ASGIHandler(threads=2)(scope, receive, send))
+        return messages
+
+    def test_page(self):
+        """ASGI application serves Django pages."""
+        start, body = self.request(reverse('about:author'))
+        self.assertEqual(start['status'], HTTPStatus.OK)
+        self.assertIn(
+            (b'content-type', b'text/html; charset=utf-8'), start['headers'])
+        self.assertIn('Об авторе', body['body'].decode())
+
+    def test_not_found(self):
+        """Missing page gets custom 404 page."""
+        start, _ = self.request('/nonexist-page/')
+        self.assertEqual(start['status'], HTTPStatus.NOT_FOUND)
+
+    @override_settings(EVENTS_ENABLED=True)
+    def test_event_streams_hold_no_thread(self):
+        """Open event streams leave the pool to other pages."""
+        handler = ASGIHandler(threads=2)
+        left = asyncio.Event()
+
+        def client(path, messages):
+            incoming = [{'type': 'http.request', 'body': b''}]
+
+            async def receive():
+                if incoming:
+                    return incoming.pop()
+                await left.wait()
+                return {'type': 'http.disconnect'}
+
+            async def send(message):
+                messages.append(message)
+
+            scope = {
+                'type': 'http',
+                'method': 'GET',
+                'path': path,
+                'query_string': b'',
+                'headers': [(b'host', b'localhost')],
+            }
+            return handler(scope, receive, send)
+
+        async def run():
+            streams = [[] for _ in range(3)]
+            tasks = [
+                asyncio.ensure_future(client(reverse('posts:events'), sent))
+                for sent in streams
+            ]
+            page = []
+            await asyncio.wait_for(
+                client(reverse('about:author'), page), timeout=3)
+            left.set()
+            await asyncio.wait_for(asyncio.gather(*tasks), timeout=3)
+            return streams, page
+
+        streams, page = asyncio.run(run())
+        self.assertEqual(page[0]['status'], HTTPStatus.OK)
+        for sent in streams:
+            self.assertTrue(sent[1]['body'].startswith(b'retry:'))
+
+
+class FlakyEmailBackend(EmailBackend):
+    """Fails every other message."""
+    calls = 0
+
+    def send_messages(self, messages):
+        FlakyEmailBackend.calls += 1
+        if FlakyEmailBackend.calls % 2:
+            raise OSError('Connection reset')
+        return super().send_messages(messages)
+
+
+@override_settings(
+    EMAIL_BACKEND='core.mail.QueuedEmailBackend',
+    MAIL_QUEUE_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+    MAIL_QUEUE_BACKOFF=0.01,
+)
+class MailQueueTest(TestCase):
+    def test_password_reset_is_queued(self):
+        """Reset mail is sent by the worker after the response."""
+        get_user_model().objects.create_user(
+            username='auth', email='auth@example.com', password='secret')
+        response = Client().post(
+            reverse('users:password_reset_form'),
+            {'email': 'auth@example.com'},
+        )
+        self.assertEqual(response.status_code, HTTPStatus.FOUND)
+        self.assertTrue(mail_queue.drain(timeout=5))
+        self.assertEqual(mail.outbox[0].to, ['auth@example.com'])
+
+    @override_settings(
+        MAIL_QUEUE_BACKEND='core.tests.FlakyEmailBackend',
+        MAIL_QUEUE_RETRIES=1,
+    )
+    def test_failures_are_retried(self):
+        """Failed messages are retried, then counted as failed."""
+        queue = MailQueue()
+        FlakyEmailBackend.calls = 0
+        with self.assertLogs('core.mail', 'ERROR') as logs:
+            queue.put([mail.EmailMessage('Hi', 'Text', to=['a@example.com'])])
+            self.assertTrue(queue.drain(timeout=5))
+            self.assertEqual(len(mail.outbox), 1)
+            with self.settings(MAIL_QUEUE_RETRIES=0):
+                queue.put(
+                    [mail.EmailMessage('Hi', 'Text', to=['b@example.com'])])
+                self.assertTrue(queue.drain(timeout=5))
+        self.assertEqual(
+            [record.getMessage() for record in logs.records],
+            ["Cannot send mail to ['a@example.com']",
+             "Cannot send mail to ['b@example.com']"],
+        )
+        self.assertEqual(
+            queue.stats(),
+            {'depth': 0, 'waiting_retry': 0, 'queued': 2, 'sent': 1,
+             'retried': 1, 'failed': 1},
+        )
+
+
+class StaticPipelineTest(TestCase):
+    def setUp(self):
+        self.source = tempfile.mkdtemp()
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.source)
+        self.addCleanup(shutil.rmtree, self.root)
+        with open(os.path.join(self.source, 'site.css'), 'w') as css:
+            css.write('body { color: black; }\n' * 100)
+        with open(os.path.join(self.source, 'tiny.css'), 'w') as css:
+            css.write('p { margin: 0; }')
+        self.settings = override_settings(
+            STATICFILES_DIRS=[self.source],
+            STATIC_ROOT=self.root,
+            STATICFILES_STORAGE=(
+                'core.storage.CompressedManifestStaticFilesStorage'),
+            STATIC_SERVE=True,
+        )
+        self.settings.enable()
+        self.addCleanup(self.settings.disable)
+        call_command('collectstatic', interactive=False, verbosity=0)
+        with open(os.path.join(self.root, 'staticfiles.json')) as manifest:
+            self.hashed = json.load(manifest)['paths']['site.css']
+
+    def get(self, path, **headers):
+        middleware = StaticFilesMiddleware(lambda request: None)
+        return middleware(RequestFactory().get(path, **headers))
+
+    def test_collectstatic_compresses(self):
+        """Hashed and plain names get .gz variants, tiny files do not."""
+        for name in ('site.css', self.hashed):
+            self.assertTrue(os.path.exists(
+                os.path.join(self.root, name + '.gz')))
+        self.assertFalse(os.path.exists(
+            os.path.join(self.root, 'tiny.css.gz')))
+
+    def test_hashed_file_is_immutable(self):
+        """Compressed variant is sent and cached for a year."""
+        response = self.get(
+            '/static/' + self.hashed, HTTP_ACCEPT_ENCODING='gzip, br;q=0')
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(response['Content-Type'], 'text/css')
+        body = b''.join(response.streaming_content)
+        self.assertEqual(len(body), int(response['Content-Length']))
+        response.close()
+
+    def test_plain_file_is_revalidated(self):
+        """Unhashed names are cached shortly and answer If-Modified-Since."""
+        response = self.get('/static/site.css')
+        self.assertNotIn('Content-Encoding', response)
+        self.assertEqual(
+            response['Cache-Control'],
+            f'public, max-age={settings.STATIC_MAX_AGE}',
+        )
+        response.close()
+        response = self.get(
+            '/static/site.css',
+            HTTP_IF_MODIFIED_SINCE=response['Last-Modified'],
+        )
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+
+    def test_outside_root(self):
+        """Missing files and paths out of STATIC_ROOT fall through."""
+        self.assertIsNone(self.get('/static/missing.css'))
+        self.assertIsNone(self.get('/static/../settings.py'))
+
+
+class MediaServingTest(TestCase):
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        self.data = bytes(range(256)) * 40
+        os.makedirs(os.path.join(root, 'posts'))
+        with open(os.path.join(root, 'posts', 'small.gif'), 'wb') as image:
+            image.write(self.data)
+        self.settings = override_settings(MEDIA_ROOT=root)
+        self.settings.enable()
+        self.addCleanup(self.settings.disable)
+        self.url = '/media/posts/small.gif'
+
+    def get(self, **headers):
+        response = self.client.get(self.url, **headers)
+        body = b''.join(getattr(response, 'streaming_content', []))
+        response.close()
+        return response, body
+
+    def test_whole_file(self):
+        """File is sent with validators and a long lifetime."""
+        response, body = self.get()
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(body, self.data)
+        self.assertEqual(response['Content-Type'], 'image/gif')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertIn(str(settings.MEDIA_MAX_AGE), response['Cache-Control'])
+        response, _ = self.get(HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+
+    def test_ranges(self):
+        """Single ranges get 206, impossible ones 416."""
+        for header, part in (
+            ('bytes=100-199', self.data[100:200]),
+            ('bytes=10000-', self.data[10000:]),
+            ('bytes=-24', self.data[-24:]),
+        ):
+            with self.subTest(header=header):
+                response, body = self.get(HTTP_RANGE=header)
+                self.assertEqual(
+                    response.status_code, HTTPStatus.PARTIAL_CONTENT)
+                self.assertEqual(body, part)
+                self.assertEqual(int(response['Content-Length']), len(part))
+        response, _ = self.get(HTTP_RANGE='bytes=20000-')
+        self.assertEqual(
+            response.status_code, HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE)
+        self.assertEqual(
+            response['Content-Range'], f'bytes */{len(self.data)}')
+        response, body = self.get(
+            HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(body, self.data)
+
+    @override_settings(MEDIA_ACCEL='x-accel-redirect')
+    def test_accel_redirect(self):
+        """Front server is told which file to send."""
+        response, _ = self.get()
+        self.assertEqual(
+            response['X-Accel-Redirect'], '/protected-media/posts/small.gif')
+        self.assertEqual(response.content, b'')
+        self.assertNotIn('Content-Type', response)
+
+    def test_missing(self):
+        """Missing files and paths out of MEDIA_ROOT are not found."""
+        for url in ('/media/posts/none.gif', '/media/../settings.py'):
+            with self.subTest(url=url):
+                self.assertEqual(
+                    self.client.get(url).status_code, HTTPStatus.NOT_FOUND)
+
+
+class CompressionTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(username='auth')
+        Post.objects.bulk_create(
+            Post(text=f'Post {number}', author=self.user)
+            for number in range(10)
+        )
+        self.client.force_login(self.user)
+
+    def test_cached_page_is_precompressed(self):
+        """Cached pages are gzipped from parts compressed in advance."""
+        plain = self.client.get(reverse('posts:index'))
+        self.assertNotIn('Content-Encoding', plain)
+        self.assertIn('Accept-Encoding', plain['Vary'])
+        response = self.client.get(
+            reverse('posts:index'), HTTP_ACCEPT_ENCODING='gzip')
+        parts, deflated = response.precompressed
+        self.assertGreater(len(parts), 1)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertTrue(response['ETag'].startswith('W/"'))
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+
+    def test_gzip_page(self):
+        """Separately compressed parts make one valid gzip stream."""
+        request = RequestFactory().get('/')
+        request.user = self.user
+        hole = hole_marker('posts/includes/switcher.html', {}).encode()
+        content = b'<p>fixed</p>' * 50 + hole + b'<p>tail</p>' + hole
+        parts = fill(content, request)
+        self.assertEqual(len(parts), 5)
+        body = gzip_page(parts, deflate_page(content))
+        self.assertEqual(gzip.decompress(body), b''.join(parts))
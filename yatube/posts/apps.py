@@ -1,5 +1,15 @@
+import atexit
+
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class PostsConfig(AppConfig):
     name = 'posts'
+
+    def ready(self):
+        from . import holes, signals, trending, view_counts  # noqa: F401
+        if settings.COUNTERS_FLUSH_IN_BACKGROUND:
+            # Counts since the last flush are not lost on a clean shutdown
+            atexit.register(view_counts.flush)
+            atexit.register(trending.flush)
@@ -0,0 +1,155 @@
+import hashlib
+import time
+from functools import wraps
+from http import HTTPStatus
+
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from core.cache_guard import guarded_get
+from core.compression import deflate_page
+from core.holes import fill, punch
+
+VERSION_KEY = 'posts:version:{}'
+PAGE_KEY = 'posts:page:{}'
+
+
+def scope_key(*scope):
+    """Return cache key of the scope version, e.g. ('group', 'cats').
+
+    Parts are hashed, usernames and slugs may not suit memcached keys.
+    """
+    raw = ':'.join(str(part) for part in scope)
+    return VERSION_KEY.format(hashlib.md5(raw.encode()).hexdigest())
+
+
+def bump(*scopes):
+    """Mark scopes as changed.
+
+    A version is the time of the last change in milliseconds, so it can
+    be used as Last-Modified and never goes back after a cache restart.
+    """
+    now = int(time.time() * 1000)
+    keys = [scope_key(*scope) for scope in scopes]
+    current = cache.get_many(keys)
+    cache.set_many(
+        {key: max(now, current.get(key, 0) + 1) for key in keys},
+        timeout=None,
+    )
+
+
+def get_versions(*scopes):
+    """Return versions of scopes, unknown scopes are treated as new."""
+    keys = [scope_key(*scope) for scope in scopes]
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        now = int(time.time() * 1000)
+        cache.set_many({key: now for key in missing}, timeout=None)
+        versions.update(dict.fromkeys(missing, now))
+    return [versions[key] for key in keys]
+
+
+def page_validators(request, versions):
+    """ETag and Last-Modified of the page for the user of the request.
+
+    Both come from scope versions only, so they hold while the cached
+    entry is refilled. Filled holes depend on the user, whom the user
+    follows and the CSRF token of the forms.
+    """
+    raw = '{}?{}|{}|{}|{}'.format(
+        request.path,
+        request.GET.urlencode(),
+        request.user.id,
+        request.META.get('CSRF_COOKIE', ''),
+        ':'.join(str(version) for version in versions),
+    )
+    etag = quote_etag(hashlib.md5(raw.encode()).hexdigest())
+    return etag, int(max(versions) / 1000)
+
+
+def render_entry(view, request, kwargs, uncached):
+    """Cache entry of the page with holes, None for other responses.
+
+    Responses which are not cached are added to uncached.
+    """
+    request.punch_holes = True
+    try:
+        response = view(request, **kwargs)
+    finally:
+        # Pages of errors raised by the view are rendered whole
+        request.punch_holes = False
+    if response.status_code != HTTPStatus.OK:
+        uncached.append(response)
+        return None
+    return {
+        'content': response.content,
+        'deflated': deflate_page(response.content),
+        'content_type': response['Content-Type'],
+    }
+
+
+def cached_page(timeout, scope_name, kwarg=None, extra_scopes=None):
+    """Cache the page once for all users and answer conditional GET.
+
+    The cached body is rendered with holes instead of per-user fragments
+    (see core.holes), they are filled on every response. The key holds
+    versions of the page scope, so changes show up before the timeout.
+    extra_scopes(kwargs) may add scopes of the page beside its own. A
+    page that is still fresh for the client gets 304 before the entry
+    is read or rendered. An expired page is rendered by one request at
+    a time, others get the stale page meanwhile. Parts of the page around the
+    holes are kept compressed for core.compression as well. Versions
+    are kept in the cache, processes see each other's changes only with
+    a shared one (see CACHE_SHARED).
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, **kwargs)
+            scopes = [('global',), (scope_name, kwargs[kwarg]) if kwarg
+                      else (scope_name,)]
+            if extra_scopes:
+                scopes += extra_scopes(kwargs)
+            # Whom the user follows changes only the holes
+            shared = len(scopes)
+            if request.user.is_authenticated:
+                scopes.append(('follow', request.user.id))
+            versions = get_versions(*scopes)
+            request.page_version = ':'.join(
+                str(version) for version in versions[:shared])
+            raw = '{}?{}|{}'.format(
+                request.path, request.GET.urlencode(), request.page_version
+            )
+            key = PAGE_KEY.format(hashlib.md5(raw.encode()).hexdigest())
+            etag, last_modified = page_validators(request, versions)
+            response = get_conditional_response(
+                request, etag=etag, last_modified=last_modified
+            )
+            if response is None:
+                uncached = []
+                entry = guarded_get(
+                    key,
+                    lambda: render_entry(view, request, kwargs, uncached),
+                    timeout,
+                )
+                if entry is None and not uncached:
+                    # Another request rendered a page that is not cached
+                    return view(request, **kwargs)
+                if entry is None:
+                    response = uncached[0]
+                    response.content = punch(response.content, request)
+                    return response
+                parts = fill(entry['content'], request)
+                response = HttpResponse(
+                    b''.join(parts), content_type=entry['content_type'])
+                if 'deflated' in entry:
+                    response.precompressed = (parts, entry['deflated'])
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(last_modified)
+            return response
+        return wrapper
+    return decorator
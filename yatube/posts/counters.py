@@ -0,0 +1,79 @@
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Case, F, Value, When
+
+# Ids in one UPDATE, each takes three parameters and SQLite allows 999
+UPDATE_BATCH = 300
+
+_timers = set()
+_timers_lock = threading.Lock()
+
+
+def increment(queryset, field, deltas):
+    """Add deltas {pk: amount} to the field, one UPDATE per batch.
+
+    Returns pks of the rows found.
+    """
+    output_field = queryset.model._meta.get_field(field)
+    ids = list(deltas)
+    found = set()
+    for start in range(0, len(ids), UPDATE_BATCH):
+        batch = queryset.filter(pk__in=ids[start:start + UPDATE_BATCH])
+        found.update(batch.order_by().values_list('pk', flat=True))
+        batch.update(**{field: F(field) + Case(
+            *[When(pk=pk, then=Value(deltas[pk]))
+              for pk in ids[start:start + UPDATE_BATCH]],
+            output_field=output_field,
+        )})
+    return found
+
+
+def _flush_in_background(flush):
+    try:
+        flush()
+    finally:
+        connections.close_all()
+
+
+def start_flush(flush):
+    """Run the flush of a counter in a thread, inline under DEBUG."""
+    if settings.COUNTERS_FLUSH_IN_BACKGROUND:
+        threading.Thread(
+            target=_flush_in_background, args=(flush,), daemon=True
+        ).start()
+    else:
+        flush()
+
+
+def _flush_periodically(counter, flush, interval):
+    while True:
+        time.sleep(getattr(settings, interval))
+        with counter.lock:
+            if counter.flushing:
+                continue
+            counter.flushing = True
+        _flush_in_background(flush)
+
+
+def start_flush_timer(counter, flush, interval):
+    """Flush the counter every `interval` setting seconds in background.
+
+    Without it counts wait for the next event while the site is quiet.
+    Started by the first count of a process, so workers forked after
+    the start get their own thread.
+    """
+    key = (flush, os.getpid())
+    if key in _timers:
+        return
+    with _timers_lock:
+        if key in _timers:
+            return
+        _timers.add(key)
+    threading.Thread(
+        target=_flush_periodically, args=(counter, flush, interval),
+        daemon=True,
+    ).start()
@@ -0,0 +1,142 @@
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db.models import DateTimeField, F, Value
+from django.db.models.functions import Coalesce
+from django.template.loader import get_template
+from django.utils import timezone
+
+from .lookups import LRUCache
+from .models import Digest, Follow, User
+
+logger = logging.getLogger(__name__)
+
+DIGEST_TEMPLATE = 'posts/email/digest.txt'
+POST_TEMPLATE = 'posts/email/digest_post.txt'
+
+
+def subscribers(after, chunk_size):
+    """Next users after the id who follow someone and have an email."""
+    return list(
+        User.objects.filter(id__gt=after, follower__isnull=False)
+        .exclude(email='')
+        .order_by('id')
+        .values_list('id', 'username', 'email')
+        .distinct()[:chunk_size]
+    )
+
+
+def new_posts(user_ids, now):
+    """New posts of followed authors for each user, newest first.
+
+    One query over Follow and Post: a post is new when it came after
+    the last digest of the user, or within DIGEST_PERIOD for a user who
+    got none yet.
+    """
+    since = Coalesce(
+        'user__digest__sent_at',
+        Value(
+            now - timedelta(seconds=settings.DIGEST_PERIOD),
+            output_field=DateTimeField(),
+        ),
+    )
+    rows = Follow.objects.annotate(since=since).filter(
+        user_id__in=user_ids,
+        author__posts__pub_date__gt=F('since'),
+        author__posts__pub_date__lte=now,
+    ).order_by('user_id', '-author__posts__pub_date').values_list(
+        'user_id', 'author__posts__id', 'author__username',
+        'author__posts__pub_date', 'author__posts__text',
+    )
+    posts = {}
+    for user_id, *post in rows:
+        posts.setdefault(user_id, []).append(post)
+    return posts
+
+
+class DigestRenderer:
+    """Renders digests, each post once for all its readers."""
+
+    def __init__(self):
+        self.digest = get_template(DIGEST_TEMPLATE)
+        self.post = get_template(POST_TEMPLATE)
+        self.fragments = LRUCache(
+            settings.DIGEST_FRAGMENT_CACHE_SIZE, timeout=float('inf'))
+
+    def render_post(self, post_id, author, pub_date, text):
+        fragment = self.fragments.get(post_id)
+        if fragment is None:
+            fragment = self.post.render({
+                'post_id': post_id,
+                'author': author,
+                'pub_date': pub_date,
+                'text': text,
+                'site_url': settings.SITE_URL,
+            })
+            self.fragments.set(post_id, fragment)
+        return fragment
+
+    def render(self, username, posts):
+        shown = posts[:settings.DIGEST_MAX_POSTS]
+        return self.digest.render({
+            'username': username,
+            'posts': [self.render_post(*post) for post in shown],
+            'more': len(posts) - len(shown),
+            'site_url': settings.SITE_URL,
+        })
+
+
+def mark_sent(user_ids, now):
+    """Remember when the users got their digests."""
+    existing = set(Digest.objects.filter(
+        user_id__in=user_ids).values_list('user_id', flat=True))
+    Digest.objects.filter(user_id__in=existing).update(sent_at=now)
+    Digest.objects.bulk_create(
+        [Digest(user_id=user_id, sent_at=now)
+         for user_id in user_ids if user_id not in existing],
+        batch_size=settings.API_BULK_BATCH,
+        ignore_conflicts=True,
+    )
+
+
+def send_digests(chunk_size=None):
+    """Send digests to all users with new posts to read.
+
+    Users are taken in chunks by id, so memory does not grow with their
+    number. Each chunk is sent over a connection of MAIL_QUEUE_BACKEND
+    right away rather than through the in-process queue, and marked as
+    sent only when all its mail was delivered; a failed chunk is sent
+    again next time. Returns the number of digests sent.
+    """
+    chunk_size = chunk_size or settings.DIGEST_CHUNK
+    now = timezone.now()
+    renderer = DigestRenderer()
+    sent = 0
+    after = 0
+    with get_connection(settings.MAIL_QUEUE_BACKEND) as connection:
+        while True:
+            users = subscribers(after, chunk_size)
+            if not users:
+                return sent
+            after = users[-1][0]
+            posts = new_posts([user_id for user_id, _, _ in users], now)
+            messages = [
+                EmailMessage(
+                    settings.DIGEST_SUBJECT,
+                    renderer.render(username, posts[user_id]),
+                    to=[email],
+                    connection=connection,
+                )
+                for user_id, username, email in users if user_id in posts
+            ]
+            try:
+                delivered = connection.send_messages(messages) or 0
+            except Exception:
+                logger.exception('Cannot send digests of users after %s',
+                                 users[0][0] - 1)
+                continue
+            sent += delivered
+            if delivered == len(messages):
+                mark_sent(list(posts), now)
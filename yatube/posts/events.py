@@ -0,0 +1,90 @@
+import asyncio
+import json
+import time
+
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+
+from core.pubsub import get_broker
+
+from .models import Follow, Group
+
+
+def post_event(post):
+    """Event about a new post, only what a client needs to show it."""
+    return {
+        'id': post.pk,
+        'author': post.author.username,
+        'author_id': post.author_id,
+        'group': post.group.slug if post.group_id else None,
+        'url': reverse('posts:post_detail', args=[post.pk]),
+    }
+
+
+def publish_posts(posts):
+    broker = get_broker()
+    for post in posts:
+        broker.publish(post_event(post))
+
+
+def feed_filter(request):
+    """Predicate of events for ?group=<slug>, ?feed=follow or all posts."""
+    slug = request.GET.get('group')
+    if slug:
+        group = get_object_or_404(Group, slug=slug)
+        return lambda event: event['group'] == group.slug
+    if request.GET.get('feed') == 'follow':
+        if not request.user.is_authenticated:
+            raise PermissionDenied
+        authors = set(Follow.objects.filter(
+            user=request.user).values_list('author_id', flat=True))
+        return lambda event: event['author_id'] in authors
+    return None
+
+
+def event_message(event):
+    return 'id: {}\nevent: post\ndata: {}\n\n'.format(
+        event['id'], json.dumps(event))
+
+
+def stream(predicate):
+    """Server-Sent Events with new posts, comments keep the link open.
+
+    The stream ends after EVENTS_STREAM_TIME, the browser reconnects by
+    itself, so a worker is not held forever.
+    """
+    subscription = get_broker().subscribe(predicate)
+    try:
+        yield f'retry: {settings.EVENTS_RETRY_MS}\n\n'
+        deadline = time.monotonic() + settings.EVENTS_STREAM_TIME
+        while time.monotonic() < deadline:
+            event = subscription.get(timeout=settings.EVENTS_HEARTBEAT)
+            if event is None:
+                yield ': ping\n\n'
+            else:
+                yield event_message(event)
+    finally:
+        subscription.close()
+
+
+async def stream_async(predicate):
+    """The stream for core.asgi, waiting for events in the event loop.
+
+    A thread is not held by an open stream, so idle clients cost only
+    their connections.
+    """
+    subscription = get_broker().subscribe(
+        predicate, loop=asyncio.get_event_loop())
+    try:
+        yield f'retry: {settings.EVENTS_RETRY_MS}\n\n'.encode()
+        deadline = time.monotonic() + settings.EVENTS_STREAM_TIME
+        while time.monotonic() < deadline:
+            event = await subscription.get(settings.EVENTS_HEARTBEAT)
+            if event is None:
+                yield b': ping\n\n'
+            else:
+                yield event_message(event).encode()
+    finally:
+        subscription.close()
@@ -0,0 +1,222 @@
+import random
+import sys
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Follow, FollowChange
+
+EMPTY = array('i')
+
+
+def _contains(ids, value):
+    index = bisect_left(ids, value)
+    return index < len(ids) and ids[index] == value
+
+
+def _insert(ids, value):
+    index = bisect_left(ids, value)
+    if index < len(ids) and ids[index] == value:
+        return False
+    ids.insert(index, value)
+    return True
+
+
+def _remove(ids, value):
+    index = bisect_left(ids, value)
+    if index < len(ids) and ids[index] == value:
+        del ids[index]
+        return True
+    return False
+
+
+class FollowGraph:
+    """Who follows whom, as sorted arrays of user ids.
+
+    An edge takes two 4-byte ids, one in the followees of the user and
+    one in the followers of the author, lookups are binary searches.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self._following = {}
+        self._followers = {}
+        self.edges = 0
+
+    def load(self, edges):
+        """Replace the graph with (user_id, author_id) pairs."""
+        following = defaultdict(lambda: array('i'))
+        followers = defaultdict(lambda: array('i'))
+        count = 0
+        for user_id, author_id in edges:
+            following[user_id].append(author_id)
+            followers[author_id].append(user_id)
+            count += 1
+        for adjacency in (following, followers):
+            for key, ids in adjacency.items():
+                adjacency[key] = array('i', sorted(ids))
+        with self.lock:
+            self._following = dict(following)
+            self._followers = dict(followers)
+            self.edges = count
+
+    def add(self, user_id, author_id):
+        with self.lock:
+            following = self._following.setdefault(user_id, array('i'))
+            if _insert(following, author_id):
+                _insert(
+                    self._followers.setdefault(author_id, array('i')),
+                    user_id,
+                )
+                self.edges += 1
+
+    def remove(self, user_id, author_id):
+        with self.lock:
+            if _remove(self._following.get(user_id, EMPTY), author_id):
+                _remove(self._followers.get(author_id, EMPTY), user_id)
+                self.edges -= 1
+
+    def follows(self, user_id, author_id):
+        """Does the user follow the author."""
+        return _contains(self._following.get(user_id, EMPTY), author_id)
+
+    def following(self, user_id):
+        """Sorted ids of authors the user follows."""
+        return self._following.get(user_id, EMPTY)
+
+    def users(self):
+        """Sorted ids of users who follow someone."""
+        return sorted(self._following)
+
+    def followers(self, author_id):
+        """Sorted ids of followers of the author."""
+        return self._followers.get(author_id, EMPTY)
+
+    def mutual(self, user_id):
+        """Ids of users who follow the user and are followed back."""
+        following = self.following(user_id)
+        followers = self.followers(user_id)
+        result = []
+        i = j = 0
+        while i < len(following) and j < len(followers):
+            if following[i] == followers[j]:
+                result.append(following[i])
+                i += 1
+                j += 1
+            elif following[i] < followers[j]:
+                i += 1
+            else:
+                j += 1
+        return result
+
+    def memory_usage(self):
+        """Bytes taken by the arrays and the dicts holding them."""
+        total = sys.getsizeof(self._following) + sys.getsizeof(
+            self._followers)
+        for adjacency in (self._following, self._followers):
+            total += sum(sys.getsizeof(ids) for ids in adjacency.values())
+        return total
+
+
+_graph = None
+_synced = 0
+_changes_since = None
+_lock = threading.Lock()
+
+
+def _load_from_db(graph):
+    graph.load(
+        Follow.objects.order_by('user_id', 'author_id').values_list(
+            'user_id', 'author_id').iterator(chunk_size=10000)
+    )
+
+
+def _apply_changes(graph, since):
+    """Apply changes logged since the time, in the order they were made.
+
+    Changes set the state of an edge, so ones applied before are
+    applied again harmlessly. Returns the time to read from next.
+    """
+    now = timezone.now()
+    changes = FollowChange.objects.filter(created__gte=since).order_by(
+        'id').values_list('user_id', 'author_id', 'followed')
+    for user_id, author_id, followed in changes.iterator(chunk_size=1000):
+        if followed:
+            graph.add(user_id, author_id)
+        else:
+            graph.remove(user_id, author_id)
+    # Changes committed late keep their earlier time, they are read
+    # again for FOLLOW_GRAPH_SYNC_MARGIN seconds
+    return now - timedelta(seconds=settings.FOLLOW_GRAPH_SYNC_MARGIN)
+
+
+def get_graph():
+    """Graph of the process, None when FOLLOW_GRAPH is off.
+
+    The graph is loaded on first use, changes of other processes are
+    read from the FollowChange log every FOLLOW_GRAPH_SYNC seconds by
+    one thread while the others use the graph as it is. A process which
+    has not read the log for longer than it is kept loads it again.
+    """
+    global _graph, _synced, _changes_since
+    if not settings.FOLLOW_GRAPH:
+        return None
+    now = time.monotonic()
+    if _graph is not None and now - _synced < settings.FOLLOW_GRAPH_SYNC:
+        return _graph
+    if not _lock.acquire(blocking=_graph is None):
+        return _graph
+    try:
+        if _graph is None or now - _synced > settings.FOLLOW_GRAPH_LOG_TIME:
+            graph = FollowGraph()
+            since = timezone.now() - timedelta(
+                seconds=settings.FOLLOW_GRAPH_SYNC_MARGIN)
+            _load_from_db(graph)
+            _changes_since = _apply_changes(graph, since)
+            _graph = graph
+        elif now - _synced >= settings.FOLLOW_GRAPH_SYNC:
+            _changes_since = _apply_changes(_graph, _changes_since)
+        _synced = now
+    finally:
+        _lock.release()
+    return _graph
+
+
+def reset_graph():
+    """Forget the graph, it is loaded again on next use."""
+    global _graph
+    with _lock:
+        _graph = None
+
+
+def follow_changed(user_id, author_id, followed):
+    """Log a change of follows and apply it here once committed.
+
+    The log entry is written in the transaction of the change, so
+    rolled back changes reach no graph. Entries older than
+    FOLLOW_GRAPH_LOG_TIME are removed now and then.
+    """
+    if not settings.FOLLOW_GRAPH:
+        return
+    FollowChange.objects.create(
+        user_id=user_id, author_id=author_id, followed=followed)
+    if random.random() < settings.FOLLOW_GRAPH_TRIM_CHANCE:
+        FollowChange.objects.filter(created__lt=timezone.now() - timedelta(
+            seconds=settings.FOLLOW_GRAPH_LOG_TIME)).delete()
+
+    def apply():
+        graph = _graph
+        if graph is None:
+            return
+        if followed:
+            graph.add(user_id, author_id)
+        else:
+            graph.remove(user_id, author_id)
+    transaction.on_commit(apply)
@@ -0,0 +1,23 @@
+from core.holes import hole_context
+
+from .follow_graph import get_graph
+from .forms import CommentForm
+from .models import Follow
+
+
+@hole_context('posts/includes/follow_button.html')
+def follow_button(request, username, author_id):
+    if not request.user.is_authenticated:
+        return {'following': False}
+    graph = get_graph()
+    if graph is not None:
+        return {'following': graph.follows(request.user.id, author_id)}
+    following = Follow.objects.filter(
+        user=request.user, author_id=author_id
+    ).exists()
+    return {'following': following}
+
+
+@hole_context('posts/includes/post_actions.html')
+def post_actions(request, post_id, author):
+    return {'form': CommentForm()}
@@ -0,0 +1,181 @@
+import os
+import posixpath
+import time
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from sorl.thumbnail import default, delete
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile
+from sorl.thumbnail.kvstores.base import add_prefix
+
+from .models import Post
+
+
+def storage():
+    return Post._meta.get_field('image').storage
+
+
+def release(names):
+    """Delete images no post refers to any more, with their thumbnails.
+
+    Posts referring to an image are counted by the indexed image column,
+    so the count cannot drift from the rows. An upload of the same
+    content refreshes the file, files changed within GC_MEDIA_MIN_AGE
+    may belong to a post being saved and are left to gc_media.
+    """
+    names = set(names) - {''}
+    if not names:
+        return
+    used = set(Post.objects.filter(
+        image__in=names).values_list('image', flat=True))
+    deadline = time.time() - settings.GC_MEDIA_MIN_AGE
+    for name in names - used:
+        if not is_recent(name, deadline):
+            delete(ImageFile(name, storage()))
+
+
+def is_recent(name, deadline):
+    """Whether the image changed after deadline and must be kept.
+
+    Missing files are old, names out of MEDIA_ROOT are never deleted.
+    """
+    try:
+        return os.path.getmtime(storage().path(name)) >= deadline
+    except SuspiciousFileOperation:
+        # Names assigned by hand may point out of MEDIA_ROOT
+        return True
+    except FileNotFoundError:
+        return False
+
+
+def referenced_images(chunk_size):
+    """Names of images posts refer to, read from the database in chunks."""
+    names = Post.objects.exclude(image='').order_by().values_list(
+        'image', flat=True)
+    return set(names.iterator(chunk_size=chunk_size))
+
+
+def walk(directory):
+    """Names under MEDIA_ROOT and modification times of files in directory."""
+    directories = [directory.rstrip('/')]
+    while directories:
+        current = directories.pop()
+        try:
+            entries = os.scandir(os.path.join(settings.MEDIA_ROOT, current))
+        except FileNotFoundError:
+            continue
+        with entries:
+            for entry in entries:
+                name = posixpath.join(current, entry.name)
+                if entry.is_dir(follow_symlinks=False):
+                    directories.append(name)
+                elif entry.is_file(follow_symlinks=False):
+                    yield name, entry.stat().st_mtime
+
+
+class Collector:
+    """Deletes files and thumbnail store keys in batches.
+
+    With a rate, sleeps between batches to delete no more than rate
+    files and keys a second.
+    """
+
+    def __init__(self, batch, rate=None, dry_run=False, log=None):
+        self.batch = batch
+        self.rate = rate
+        self.dry_run = dry_run
+        self.log = log
+        self.files = []
+        self.keys = []
+        self.queued = set()
+        self.deleted_files = 0
+        self.deleted_keys = 0
+        self.started = time.monotonic()
+
+    def delete_file(self, name):
+        if name in self.queued:
+            return
+        self.queued.add(name)
+        self.files.append(name)
+        if len(self.files) + len(self.keys) >= self.batch:
+            self.flush()
+
+    def delete_keys(self, keys):
+        self.keys.extend(keys)
+        if len(self.files) + len(self.keys) >= self.batch:
+            self.flush()
+
+    def flush(self):
+        if self.log:
+            for name in self.files:
+                self.log(name)
+        if not self.dry_run:
+            for name in self.files:
+                storage().delete(name)
+            if self.keys:
+                default.kvstore._delete_raw(*self.keys)
+        self.deleted_files += len(self.files)
+        self.deleted_keys += len(self.keys)
+        self.files, self.keys = [], []
+        if self.rate:
+            delay = (
+                (self.deleted_files + self.deleted_keys) / self.rate
+                - (time.monotonic() - self.started)
+            )
+            if delay > 0:
+                time.sleep(delay)
+
+
+def collect_records(collector, referenced, upload_to, deadline):
+    """Delete store records of unreferenced images and their thumbnails.
+
+    Records of images changed after deadline are kept. Returns names of
+    the thumbnails left in the store.
+    """
+    thumbnail_prefix = thumbnail_settings.THUMBNAIL_PREFIX
+    kvstore = default.kvstore
+    thumbnails = set()
+    orphans = []
+    for key in list(kvstore._find_keys(identity='image')):
+        image_file = kvstore._get(key)
+        if image_file is None:
+            continue
+        if image_file.name.startswith(thumbnail_prefix):
+            thumbnails.add(image_file.name)
+        elif (
+            image_file.name.startswith(upload_to)
+            and image_file.name not in referenced
+            and not is_recent(image_file.name, deadline)
+        ):
+            orphans.append(key)
+    for key in orphans:
+        keys = [add_prefix(key), add_prefix(key, identity='thumbnails')]
+        for thumbnail_key in kvstore._get(key, identity='thumbnails') or []:
+            keys.append(add_prefix(thumbnail_key))
+            thumbnail = kvstore._get(thumbnail_key)
+            if thumbnail is not None:
+                thumbnails.discard(thumbnail.name)
+                collector.delete_file(thumbnail.name)
+        collector.delete_keys(keys)
+    return thumbnails
+
+
+def collect_garbage(collector, min_age, chunk_size=2000):
+    """Delete images of no post, their thumbnails and stale thumbnails.
+
+    Files younger than min_age seconds may belong to a post being saved
+    and are kept.
+    """
+    referenced = referenced_images(chunk_size)
+    upload_to = Post._meta.get_field('image').upload_to
+    deadline = time.time() - min_age
+    thumbnails = collect_records(collector, referenced, upload_to, deadline)
+    for name, modified in walk(upload_to):
+        if name not in referenced and modified < deadline:
+            collector.delete_file(name)
+    for name, modified in walk(thumbnail_settings.THUMBNAIL_PREFIX):
+        if name not in thumbnails and modified < deadline:
+            collector.delete_file(name)
+    collector.flush()
+    return collector
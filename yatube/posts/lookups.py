@@ -0,0 +1,106 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.http import Http404
+
+from .models import Group, Post, User
+
+LOOKUP_KEY = 'posts:lookup:{}:{}'
+GROUP_FIELDS = ('id', 'title', 'slug', 'description')
+USER_FIELDS = ('id', 'username', 'first_name', 'last_name')
+POST_FIELDS = ('id', 'author_id')
+
+
+class LRUCache:
+    """Bounded cache of the process, entries live for `timeout` seconds."""
+
+    def __init__(self, size, timeout):
+        self.size = size
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = (value, time.monotonic() + self.timeout)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+def lookup_key(kind, value):
+    """Cache key of the lookup, values are hashed to suit memcached."""
+    digest = hashlib.md5(str(value).encode()).hexdigest()
+    return LOOKUP_KEY.format(kind, digest)
+
+
+_local = LRUCache(settings.LOOKUP_CACHE_SIZE, settings.LOOKUP_LOCAL_TIMEOUT)
+
+
+def _lookup(model, fields, kind, value):
+    """Instance with `fields` loaded, the rest is loaded on access.
+
+    Rows are looked up in the process, then in the shared cache and
+    only then in the database.
+    """
+    key = lookup_key(kind, value)
+    values = _local.get(key)
+    if values is None:
+        values = cache.get(key)
+        if values is None:
+            values = model.objects.filter(
+                **{kind: value}).values_list(*fields).first()
+            if values is None:
+                raise Http404
+            cache.set(key, values, settings.LOOKUP_CACHING_TIME)
+        _local.set(key, values)
+    return model.from_db(DEFAULT_DB_ALIAS, fields, values)
+
+
+def group_by_slug(slug):
+    return _lookup(Group, GROUP_FIELDS, 'slug', slug)
+
+
+def user_by_username(username):
+    return _lookup(User, USER_FIELDS, 'username', username)
+
+
+def post_by_id(post_id):
+    """Post with its author id, authors of posts never change."""
+    return _lookup(Post, POST_FIELDS, 'pk', post_id)
+
+
+def forget(kind, *values):
+    """Drop lookups of changed rows, old and new names.
+
+    Other processes keep theirs for LOOKUP_LOCAL_TIMEOUT seconds.
+    """
+    keys = {lookup_key(kind, value) for value in values if value}
+    cache.delete_many(list(keys))
+    for key in keys:
+        _local.delete(key)
@@ -0,0 +1,49 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts.follow_graph import FollowGraph
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure memory and lookup time of the follow graph '
+        'on random follows.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--edges', type=int, default=10_000_000)
+        parser.add_argument('--users', type=int, default=1_000_000)
+        parser.add_argument('--lookups', type=int, default=100_000)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rand = random.Random(options['seed'])
+        users = options['users']
+        edges = (
+            (rand.randrange(users), rand.randrange(users))
+            for _ in range(options['edges'])
+        )
+        graph = FollowGraph()
+        start = time.perf_counter()
+        graph.load(edges)
+        self.stdout.write(
+            f'load: {graph.edges} edges in '
+            f'{time.perf_counter() - start:.1f} s, '
+            f'{graph.memory_usage() / 2 ** 20:.1f} MiB, '
+            f'{graph.memory_usage() / max(graph.edges, 1):.1f} B per edge'
+        )
+        pairs = [(rand.randrange(users), rand.randrange(users))
+                 for _ in range(options['lookups'])]
+        for name, lookup in (
+            ('follows', lambda user, author: graph.follows(user, author)),
+            ('followers', lambda user, author: graph.followers(author)),
+            ('mutual', lambda user, author: graph.mutual(user)),
+        ):
+            start = time.perf_counter()
+            for user, author in pairs:
+                lookup(user, author)
+            elapsed = time.perf_counter() - start
+            self.stdout.write(
+                f'{name}: {elapsed / len(pairs) * 1e6:.2f} us per lookup')
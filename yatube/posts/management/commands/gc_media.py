@@ -0,0 +1,39 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts.images import Collector, collect_garbage
+
+
+class Command(BaseCommand):
+    help = (
+        'Remove uploaded images no post refers to, their thumbnails and '
+        'thumbnails left without a record in the thumbnail store.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Only count what would be removed.')
+        parser.add_argument(
+            '--batch', type=int, default=settings.GC_MEDIA_BATCH,
+            help='Files and thumbnail store keys removed at once.')
+        parser.add_argument(
+            '--rate', type=float, default=settings.GC_MEDIA_RATE,
+            help='Files and keys removed a second at most, 0 for no limit.')
+        parser.add_argument(
+            '--min-age', type=int, default=settings.GC_MEDIA_MIN_AGE,
+            help='Seconds since the last change of files to remove.')
+
+    def handle(self, *args, **options):
+        collector = Collector(
+            options['batch'],
+            rate=options['rate'],
+            dry_run=options['dry_run'],
+            log=self.stdout.write if options['verbosity'] > 1 else None,
+        )
+        collect_garbage(collector, options['min_age'])
+        action = 'to remove' if options['dry_run'] else 'removed'
+        self.stdout.write(
+            f'{collector.deleted_files} files and {collector.deleted_keys} '
+            f'thumbnail store keys {action}'
+        )
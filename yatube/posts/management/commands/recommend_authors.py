@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts.recommendations import rebuild
+
+
+class Command(BaseCommand):
+    help = (
+        'Compute "who to follow" recommendations of all users '
+        'from their follows.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=None,
+            help='Processes to use, all CPU cores by default.')
+        parser.add_argument(
+            '--top', type=int, default=None,
+            help='Recommendations kept per user.')
+        parser.add_argument(
+            '--sample', type=int, default=None,
+            help='Readers of an author compared for co-follows.')
+        parser.add_argument('--chunk-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        count = rebuild(
+            workers=options['workers'],
+            top=options['top'],
+            sample=options['sample'],
+            chunk_size=options['chunk_size'],
+        )
+        self.stdout.write(
+            f'{count} users in {time.perf_counter() - start:.1f} s')
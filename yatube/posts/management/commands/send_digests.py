@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from posts.digests import send_digests
+
+
+class Command(BaseCommand):
+    help = 'Email users new posts of the authors they follow.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=None,
+            help='Users handled at once.')
+
+    def handle(self, *args, **options):
+        sent = send_digests(chunk_size=options['chunk_size'])
+        self.stdout.write(f'{sent} digests sent')
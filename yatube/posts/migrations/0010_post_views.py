@@ -0,0 +1,26 @@
+# Generated by Django 2.2.16 on 2026-10-19 08:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0009_trend'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostViewers',
+            fields=[
+                ('post', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='viewers', serialize=False, to='posts.Post')),
+                ('registers', models.BinaryField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='views',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Просмотры'),
+        ),
+    ]
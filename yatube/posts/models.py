@@ -1,5 +1,7 @@
 from django.contrib.auth import get_user_model
 from django.db import models
+
+from core.storage import ContentAddressedStorage
 from posts.validators import validate_not_empty
 
 User = get_user_model()
@@ -21,10 +23,27 @@ class Group(models.Model):
         verbose_name='Описание группы',
         help_text='Опишите группу'
     )
+    # Kept up to date by posts.signals
+    posts_count = models.PositiveIntegerField(
+        verbose_name='Число постов',
+        default=0,
+        editable=False
+    )
+    last_post_at = models.DateTimeField(
+        verbose_name='Последний пост',
+        null=True,
+        blank=True,
+        editable=False
+    )
 
     def __str__(self):
         return self.title
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['-last_post_at'], name='group_activity_idx')
+        ]
+
 
 class Post(models.Model):
     """Class for creating posts."""
@@ -53,8 +72,16 @@ class Post(models.Model):
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
+        storage=ContentAddressedStorage(),
+        # Posts sharing an image are counted by it
+        db_index=True,
         blank=True
     )
+    views = models.PositiveIntegerField(
+        'Просмотры',
+        default=0,
+        editable=False
+    )
 
     def __str__(self):
         return self.text
@@ -108,3 +135,98 @@ class Follow(models.Model):
             models.UniqueConstraint(fields=['user', 'author'],
                                     name='unique_follow')
         ]
+
+
+class FollowChange(models.Model):
+    """Follow or unfollow, read by processes keeping follows in memory."""
+    user_id = models.IntegerField()
+    author_id = models.IntegerField()
+    followed = models.BooleanField()
+    created = models.DateTimeField(auto_now_add=True, db_index=True)
+
+
+class Recommendation(models.Model):
+    """Author recommended to the user, computed by recommend_authors."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='recommendations',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['rank']
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'rank'],
+                                    name='unique_recommendation_rank')
+        ]
+
+
+class PostViewers(models.Model):
+    """HyperLogLog registers of the viewers, see posts.view_counts."""
+    post = models.OneToOneField(
+        Post,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='viewers',
+    )
+    registers = models.BinaryField()
+
+
+class Trend(models.Model):
+    """Time-decayed engagement, see posts.trending.
+
+    The score is counted in units of the start of the epoch: a point
+    earned one half-life after it is worth 2.
+    """
+    score = models.FloatField(default=0)
+    epoch = models.PositiveIntegerField()
+
+    class Meta:
+        abstract = True
+
+
+class PostTrend(Trend):
+    post = models.OneToOneField(
+        Post,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='trend',
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-score'], name='post_trend_score_idx')
+        ]
+
+
+class GroupTrend(Trend):
+    group = models.OneToOneField(
+        Group,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='trend',
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-score'], name='group_trend_score_idx')
+        ]
+
+
+class Digest(models.Model):
+    """When the user was last sent new posts of followed authors."""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='digest',
+    )
+    sent_at = models.DateTimeField()
@@ -0,0 +1,63 @@
+from django.db.models import F
+
+from .follow_graph import get_graph
+from .models import Comment, Group, Post, Recommendation
+
+# SQLite allows 999 parameters in a query
+MAX_IN_IDS = 900
+
+
+def feed():
+    """All posts, newest first."""
+    return Post.objects.all()
+
+
+def groups_by_activity():
+    """Groups with the latest post first, stats without joins."""
+    return Group.objects.only(
+        'title', 'slug', 'posts_count', 'last_post_at'
+    ).order_by(F('last_post_at').desc(nulls_last=True), 'title')
+
+
+def group_feed(group_id):
+    """Posts of the group."""
+    return Post.objects.filter(group_id=group_id)
+
+
+def author_feed(author_id):
+    """Posts of the author."""
+    return Post.objects.filter(author_id=author_id)
+
+
+def follow_feed(user):
+    """Posts of the authors the user follows.
+
+    With the follow graph the join with Follow is replaced by ids.
+    """
+    graph = get_graph()
+    if graph is not None:
+        authors = graph.following(user.id)
+        if len(authors) <= MAX_IN_IDS:
+            return Post.objects.filter(author_id__in=list(authors))
+    return Post.objects.filter(author__following__user=user)
+
+
+def trending_posts():
+    """Posts with engagement, most trending first."""
+    return Post.objects.filter(trend__isnull=False).order_by('-trend__score')
+
+
+def trending_groups():
+    """Groups with engagement, most trending first."""
+    return Group.objects.filter(trend__isnull=False).order_by(
+        '-trend__score')
+
+
+def post_comments(post_id):
+    """Comments of the post, newest first."""
+    return Comment.objects.filter(post_id=post_id)
+
+
+def recommended_authors(user_id):
+    """Authors recommended to the user, best first."""
+    return Recommendation.objects.filter(user_id=user_id)
@@ -0,0 +1,107 @@
+import heapq
+import multiprocessing
+import os
+from collections import Counter
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+
+from .follow_graph import FollowGraph
+from .models import Follow, Recommendation
+
+# Graph of the worker processes, inherited from the parent on fork
+_graph = None
+
+
+def recommend(graph, user_id, top, sample):
+    """Best (author_id, score) pairs for the user, best first.
+
+    Authors followed by the authors the user follows score 1 each
+    (friends of friends). Each followed author also adds the share of
+    its readers who follow the candidate too (co-follow similarity),
+    counted on at most `sample` readers spread over the followers.
+    """
+    following = graph.following(user_id)
+    scores = Counter()
+    for author_id in following:
+        scores.update(graph.following(author_id))
+        readers = graph.followers(author_id)
+        step = max(1, len(readers) // sample)
+        readers = readers[::step][:sample]
+        weight = 1 / len(readers)
+        for reader in readers:
+            if reader == user_id:
+                continue
+            for candidate in graph.following(reader):
+                scores[candidate] += weight
+    scores.pop(user_id, None)
+    for author_id in following:
+        scores.pop(author_id, None)
+    return heapq.nlargest(
+        top, scores.items(), key=lambda item: (item[1], -item[0]))
+
+
+def _recommend_chunk(args):
+    user_ids, top, sample = args
+    return [
+        (user_id, recommend(_graph, user_id, top, sample))
+        for user_id in user_ids
+    ]
+
+
+def _save_chunk(results):
+    user_ids = [user_id for user_id, _ in results]
+    with transaction.atomic():
+        Recommendation.objects.filter(user_id__in=user_ids).delete()
+        Recommendation.objects.bulk_create(
+            [
+                Recommendation(
+                    user_id=user_id, author_id=author_id,
+                    rank=rank, score=score,
+                )
+                for user_id, best in results
+                for rank, (author_id, score) in enumerate(best)
+            ],
+            batch_size=settings.API_BULK_BATCH,
+        )
+    return len(user_ids)
+
+
+def rebuild(workers=None, top=None, sample=None, chunk_size=500):
+    """Compute recommendations of all users and replace the saved ones.
+
+    Users are split into chunks scored by a pool of processes which
+    share the graph loaded before the fork. Rows of users who follow
+    nobody any more are removed at the end. Returns the number of users.
+    """
+    global _graph
+    top = top or settings.RECOMMENDATIONS_TOP
+    sample = sample or settings.RECOMMENDATIONS_SAMPLE
+    workers = workers or os.cpu_count() or 1
+    started = timezone.now()
+    graph = FollowGraph()
+    graph.load(Follow.objects.values_list(
+        'user_id', 'author_id').iterator(chunk_size=10000))
+    users = graph.users()
+    chunks = [
+        (users[start:start + chunk_size], top, sample)
+        for start in range(0, len(users), chunk_size)
+    ]
+    _graph = graph
+    count = 0
+    try:
+        if workers > 1 and 'fork' in multiprocessing.get_all_start_methods():
+            # Children must not reuse connections of the parent
+            connections.close_all()
+            context = multiprocessing.get_context('fork')
+            with context.Pool(workers) as pool:
+                for results in pool.imap_unordered(_recommend_chunk, chunks):
+                    count += _save_chunk(results)
+        else:
+            for chunk in chunks:
+                count += _save_chunk(_recommend_chunk(chunk))
+    finally:
+        _graph = None
+    Recommendation.objects.filter(created__lt=started).delete()
+    return count
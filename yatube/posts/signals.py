@@ -0,0 +1,195 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Max
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+from django.urls import reverse
+
+from . import follow_graph, images, lookups, trending
+from .caching import bump
+from .events import publish_posts
+from .models import Comment, Follow, Group, Post, Recommendation, User
+from .warming import schedule_warming
+
+
+@receiver(post_init, sender=Post)
+def remember_group(sender, instance, **kwargs):
+    """Keep the loaded group to invalidate it when the post moves."""
+    instance._loaded_group_id = instance.__dict__.get('group_id')
+
+
+@receiver(post_init, sender=Post)
+def remember_image(sender, instance, **kwargs):
+    """Keep the loaded image to release it when it is replaced."""
+    image = instance.__dict__.get('image')
+    instance._loaded_image = image if isinstance(image, str) else None
+
+
+def post_scopes(post):
+    """Scopes whose pages show the post."""
+    scopes = [('index',), ('profile', post.author.username)]
+    group_ids = {post.group_id, getattr(post, '_loaded_group_id', None)}
+    group_ids.discard(None)
+    scopes += [
+        ('group', slug) for slug in Group.objects.filter(
+            pk__in=group_ids).values_list('slug', flat=True)
+    ]
+    return scopes
+
+
+def new_posts_scopes(author, group_ids):
+    """Scopes changed by new posts of the author."""
+    scopes = [('index',), ('profile', author.username)]
+    scopes += [
+        ('group', slug) for slug in Group.objects.filter(
+            pk__in=group_ids).values_list('slug', flat=True)
+    ]
+    # post_detail shows the number of posts of the author
+    scopes.append(('author', author.id))
+    return scopes
+
+
+def refresh_group_stats(group_ids):
+    """Count posts of the groups again, for moved and deleted posts.
+
+    Posts of a deleted group are set to no group without signals, the
+    stats go away with the group.
+    """
+    group_ids = set(group_ids) - {None}
+    for group_id in group_ids:
+        stats = Post.objects.filter(group_id=group_id).aggregate(
+            count=Count('id'), last=Max('pub_date'))
+        Group.objects.filter(pk=group_id).update(
+            posts_count=stats['count'], last_post_at=stats['last'])
+    if group_ids:
+        bump(('groups',))
+
+
+def posts_created(author, posts):
+    """Invalidate pages and notify readers after posts were added.
+
+    Used after bulk_create, which does not send post_save.
+    """
+    refresh_group_stats({post.group_id for post in posts})
+    bump(*new_posts_scopes(author, {post.group_id for post in posts}))
+    transaction.on_commit(lambda: publish_posts(posts))
+    if settings.CACHE_WARMING:
+        transaction.on_commit(schedule_warming)
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, **kwargs):
+    if created:
+        scopes = new_posts_scopes(instance.author, [instance.group_id])
+        transaction.on_commit(lambda: publish_posts([instance]))
+        if instance.group_id:
+            Group.objects.filter(pk=instance.group_id).update(
+                posts_count=F('posts_count') + 1,
+                last_post_at=instance.pub_date,
+            )
+            scopes.append(('groups',))
+    else:
+        scopes = post_scopes(instance) + [('post', instance.pk)]
+        if instance.group_id != instance._loaded_group_id:
+            refresh_group_stats(
+                [instance.group_id, instance._loaded_group_id])
+    bump(*scopes)
+    instance._loaded_group_id = instance.group_id
+    replaced = instance._loaded_image
+    if replaced and replaced != instance.image.name:
+        transaction.on_commit(lambda: images.release([replaced]))
+    instance._loaded_image = instance.image.name
+    if settings.CACHE_WARMING:
+        paths = [
+            reverse('posts:profile', args=[instance.author.username]),
+            reverse('posts:post_detail', args=[instance.pk]),
+        ]
+        if instance.group_id:
+            paths.append(
+                reverse('posts:group_list', args=[instance.group.slug]))
+
+        def warm():
+            schedule_warming()
+            schedule_warming(paths)
+        transaction.on_commit(warm)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    scopes = post_scopes(instance) + [
+        ('post', instance.pk), ('author', instance.author_id)]
+    bump(*scopes)
+    lookups.forget('pk', instance.pk)
+    refresh_group_stats([instance.group_id])
+    if instance.image:
+        name = instance.image.name
+        transaction.on_commit(lambda: images.release([name]))
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def comment_changed(sender, instance, **kwargs):
+    bump(('post', instance.post_id))
+
+
+@receiver(post_save, sender=Comment)
+def comment_created(sender, instance, created, **kwargs):
+    if created:
+        trending.record(instance.post_id, settings.TRENDING_COMMENT_WEIGHT)
+
+
+@receiver(post_save, sender=Follow)
+def follow_saved(sender, instance, created, **kwargs):
+    bump(('follow', instance.user_id))
+    if created:
+        follow_graph.follow_changed(
+            instance.user_id, instance.author_id, True)
+        # Followed authors are not recommended until the next rebuild
+        Recommendation.objects.filter(
+            user_id=instance.user_id, author_id=instance.author_id
+        ).delete()
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    bump(('follow', instance.user_id))
+    follow_graph.follow_changed(instance.user_id, instance.author_id, False)
+
+
+@receiver(post_init, sender=User)
+def remember_username(sender, instance, **kwargs):
+    instance._loaded_username = instance.__dict__.get('username')
+
+
+@receiver(post_init, sender=Group)
+def remember_slug(sender, instance, **kwargs):
+    instance._loaded_slug = instance.__dict__.get('slug')
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, update_fields=None, **kwargs):
+    """Names of authors are shown on every page, logins are not."""
+    if update_fields and set(update_fields) <= {'last_login', 'password'}:
+        return
+    lookups.forget('username', instance.username, instance._loaded_username)
+    instance._loaded_username = instance.username
+    bump(('global',))
+
+
+@receiver(post_save, sender=Group)
+def group_saved(sender, instance, **kwargs):
+    lookups.forget('slug', instance.slug, instance._loaded_slug)
+    instance._loaded_slug = instance.slug
+    bump(('global',))
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    lookups.forget('username', instance.username)
+    bump(('global',))
+
+
+@receiver(post_delete, sender=Group)
+def group_deleted(sender, instance, **kwargs):
+    lookups.forget('slug', instance.slug)
+    bump(('global',))
@@ -1,11 +1,26 @@
+import threading
+import warnings
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from unittest import mock
+
+from core import cache_guard
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
 from django.core.cache import cache
-from django.test import Client, TestCase
+from django.core.cache.backends.base import CacheKeyWarning
+from django.db import connection
+from django.http import HttpResponseRedirect
+from django.test import Client, RequestFactory, TestCase
 from django.urls import reverse
 
-from ..models import Group, Post
+from .. import caching, signals, views, warming
+from ..models import Comment, Follow, Group, Post
 
 User = get_user_model()
+views_render = views.render
 
 
 class CacheTest(TestCase):
@@ -31,11 +46,313 @@ class CacheTest(TestCase):
     def test_cache_index_page(self):
         """Checking cache of main page:index."""
         first_view = self.authorized_client.get(reverse('posts:index'))
-        post_1 = Post.objects.get(pk=1)
-        post_1.text = 'Changed text'
-        post_1.save()
+        Post.objects.filter(pk=self.post.pk).update(text='Changed text')
         second_view = self.authorized_client.get(reverse('posts:index'))
         self.assertEqual(first_view.content, second_view.content)
         cache.clear()
         third_view = self.authorized_client.get(reverse('posts:index'))
         self.assertNotEqual(first_view.content, third_view.content)
+
+    def test_edited_post_refreshes_index(self):
+        """Post edited through the model shows on the index at once."""
+        self.authorized_client.get(reverse('posts:index'))
+        self.post.text = 'Changed text'
+        self.post.save()
+        response = self.authorized_client.get(reverse('posts:index'))
+        self.assertContains(response, 'Changed text')
+
+    def test_not_found_page_has_no_holes(self):
+        """404 raised inside a cached view is rendered whole."""
+        response = self.authorized_client.get(
+            reverse('posts:group_list', kwargs={'slug': 'nope'}))
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+        self.assertNotContains(
+            response, '<!--hole:', status_code=HTTPStatus.NOT_FOUND)
+
+
+class ConditionalGetTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='auth')
+        self.guest_client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+        self.group = Group.objects.create(
+            title='Test group',
+            slug='test-slug',
+            description='Test description',
+        )
+        self.post = Post.objects.create(
+            text='Test text',
+            author=self.user,
+            group=self.group,
+        )
+        self.urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}),
+        )
+
+    def test_unchanged_pages_return_not_modified(self):
+        """Repeated request with ETag gets 304."""
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+                self.assertIn('Cookie', response['Vary'])
+                response = self.guest_client.get(
+                    url, HTTP_IF_NONE_MATCH=response['ETag'])
+                self.assertEqual(
+                    response.status_code, HTTPStatus.NOT_MODIFIED)
+
+    def test_changes_update_etag(self):
+        """New posts and comments change ETag of the pages."""
+        etags = [self.guest_client.get(url)['ETag'] for url in self.urls[1:]]
+        Post.objects.create(text='New', author=self.user, group=self.group)
+        Comment.objects.create(post=self.post, author=self.user, text='Hi')
+        for url, etag in zip(self.urls[1:], etags):
+            with self.subTest(url=url):
+                response = self.guest_client.get(
+                    url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_etag_depends_on_user(self):
+        """Guest and logged-in user get different ETag."""
+        url = self.urls[3]
+        etag = self.guest_client.get(url)['ETag']
+        response = self.authorized_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_new_post_bumps_author_once(self):
+        """Pages of the author's posts change through one scope."""
+        Post.objects.bulk_create(
+            [Post(text=str(i), author=self.user) for i in range(20)])
+        url = self.urls[3]
+        etag = self.guest_client.get(url)['ETag']
+        with mock.patch.object(signals, 'bump', wraps=signals.bump) as bump:
+            Post.objects.create(text='New', author=self.user)
+        scopes = bump.call_args[0]
+        self.assertIn(('author', self.user.id), scopes)
+        self.assertNotIn(('post', self.post.id), scopes)
+        response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_scope_keys_suit_memcached(self):
+        """Pages of names unfit for cache keys are cached too."""
+        self.user.username = 'foo bar\n' + 'x' * 300
+        self.user.save()
+        url = reverse('posts:profile', args=[self.user.username])
+        with warnings.catch_warnings():
+            warnings.simplefilter('error', CacheKeyWarning)
+            etag = self.guest_client.get(url)['ETag']
+            response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+
+    def test_not_modified_without_cached_page(self):
+        """304 needs no cached page and renders nothing."""
+        url = self.urls[0]
+        etag = self.guest_client.get(url)['ETag']
+        versions = cache.get_many(
+            [caching.scope_key('global'), caching.scope_key('index')])
+        # Page entries are evicted or expired, scope versions stay
+        cache.clear()
+        cache.set_many(versions, timeout=None)
+        with mock.patch.object(views, 'render') as render:
+            response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+        render.assert_not_called()
+
+
+class PageHolesTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='author')
+        self.user = User.objects.create_user(username='reader')
+        self.guest_client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+        self.post = Post.objects.create(text='Test text', author=self.author)
+        self.post_url = reverse(
+            'posts:post_detail', kwargs={'post_id': self.post.id})
+        self.profile_url = reverse(
+            'posts:profile', kwargs={'username': self.author})
+
+    def test_logged_in_user_gets_cached_page(self):
+        """Page cached for guest is served with fragments of the user."""
+        response = self.guest_client.get(self.post_url)
+        self.assertNotContains(response, 'csrfmiddlewaretoken')
+        response = self.authorized_client.get(self.post_url)
+        self.assertTemplateNotUsed(response, 'posts/post_detail.html')
+        self.assertTemplateUsed(response, 'posts/includes/post_actions.html')
+        self.assertContains(response, 'Test text')
+        self.assertContains(response, 'Пользователь: reader')
+        self.assertContains(response, 'csrfmiddlewaretoken')
+        self.assertNotContains(response, '<!--hole:')
+
+    def test_follow_button_state(self):
+        """Follow button follows the state of the user, not the cache."""
+        response = self.authorized_client.get(self.profile_url)
+        self.assertContains(response, 'Подписаться')
+        Follow.objects.create(user=self.user, author=self.author)
+        response = self.authorized_client.get(self.profile_url)
+        self.assertTemplateNotUsed(response, 'posts/profile.html')
+        self.assertContains(response, 'Отписаться')
+
+
+class StampedeTest(TestCase):
+    PARALLEL_REQUESTS = 100
+
+    def setUp(self):
+        cache.clear()
+        self.renders = 0
+        self.lock = threading.Lock()
+
+    def slow_render(self, *args, **kwargs):
+        with self.lock:
+            self.renders += 1
+        time.sleep(0.1)
+        return views_render(*args, **kwargs)
+
+    def request_index(self):
+        request = RequestFactory().get(reverse('posts:index'))
+        request.user = AnonymousUser()
+        try:
+            return views.index(request).status_code
+        finally:
+            connection.close()
+
+    def parallel_requests(self):
+        with ThreadPoolExecutor(self.PARALLEL_REQUESTS) as executor:
+            futures = [executor.submit(self.request_index)
+                       for _ in range(self.PARALLEL_REQUESTS)]
+            return [future.result() for future in futures]
+
+    def test_single_render_per_expiry(self):
+        """Parallel requests render the expired index only once."""
+        with mock.patch.object(views, 'render', self.slow_render):
+            statuses = self.parallel_requests()
+            self.assertEqual(self.renders, 1)
+            expired = cache_guard.now() + settings.CACHING_TIME + 1
+            with mock.patch.object(cache_guard, 'now', lambda: expired):
+                statuses += self.parallel_requests()
+        self.assertEqual(self.renders, 2)
+        self.assertEqual(
+            statuses, [HTTPStatus.OK] * self.PARALLEL_REQUESTS * 2)
+
+    def test_lock_taken_after_fill(self):
+        """Request taking the lock after another fill serves its value."""
+        fills = []
+        raced = []
+        real_add = cache.add
+
+        def fill():
+            fills.append(True)
+            return 'page'
+
+        def add(*args, **kwargs):
+            if not raced:
+                # Another request fills the key and releases the lock
+                raced.append(True)
+                cache_guard.guarded_get('key', fill, 60)
+            return real_add(*args, **kwargs)
+
+        with mock.patch.object(cache, 'add', add):
+            self.assertEqual(cache_guard.guarded_get('key', fill, 60), 'page')
+        self.assertEqual(len(fills), 1)
+
+    def test_waiters_get_none(self):
+        """Value not to cache is filled once for parallel requests."""
+        def fill():
+            with self.lock:
+                self.renders += 1
+            time.sleep(0.1)
+
+        with ThreadPoolExecutor(self.PARALLEL_REQUESTS) as executor:
+            futures = [
+                executor.submit(cache_guard.guarded_get, 'key', fill, 60)
+                for _ in range(self.PARALLEL_REQUESTS)
+            ]
+            values = [future.result() for future in futures]
+        self.assertEqual(values, [None] * self.PARALLEL_REQUESTS)
+        self.assertEqual(self.renders, 1)
+
+    def test_waiters_render_uncached_page(self):
+        """Waiters for a page that is not cached get their own response."""
+        @caching.cached_page(60, 'test')
+        def moved(request):
+            time.sleep(0.1)
+            return HttpResponseRedirect('/')
+
+        def request_page():
+            request = RequestFactory().get('/moved/')
+            request.user = AnonymousUser()
+            return moved(request).status_code
+
+        with ThreadPoolExecutor(10) as executor:
+            futures = [executor.submit(request_page) for _ in range(10)]
+            statuses = [future.result() for future in futures]
+        self.assertEqual(statuses, [HTTPStatus.FOUND] * 10)
+
+
+class CacheWarmingTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='auth')
+        self.star = User.objects.create_user(username='star')
+        Follow.objects.create(user=self.user, author=self.star)
+        self.small_group = Group.objects.create(
+            title='Small group', slug='small', description='Small')
+        self.big_group = Group.objects.create(
+            title='Big group', slug='big', description='Big')
+        Post.objects.create(
+            text='Text', author=self.user, group=self.small_group)
+        for _ in range(2):
+            Post.objects.create(
+                text='Text', author=self.star, group=self.big_group)
+
+    def test_hot_paths(self):
+        """Hot pages are the index, busy groups and followed authors."""
+        self.assertEqual(warming.hot_paths(), [
+            reverse('posts:index'),
+            reverse('posts:group_list', args=['big']),
+            reverse('posts:group_list', args=['small']),
+            reverse('posts:profile', args=['star']),
+            reverse('posts:profile', args=['auth']),
+        ])
+
+    def test_warmed_page_is_served_from_cache(self):
+        """Request after warming does not render the page."""
+        for path in warming.hot_paths():
+            with self.subTest(path=path):
+                self.assertEqual(
+                    warming.warm_path(path).status_code, HTTPStatus.OK)
+                response = self.client.get(path)
+                self.assertTemplateUsed(response, 'includes/header.html')
+                self.assertTemplateNotUsed(response, 'base.html')
+
+    def test_rate_limiter(self):
+        """Rate limiter spreads calls in time."""
+        limiter = warming.RateLimiter(rate=100)
+        start = time.monotonic()
+        for _ in range(5):
+            limiter.wait()
+        self.assertGreaterEqual(time.monotonic() - start, 0.04)
+
+    def test_single_pool_for_parallel_starts(self):
+        """Parallel first calls make one pool and one rate limit."""
+        def slow_pool(**kwargs):
+            time.sleep(0.05)
+            return mock.Mock()
+
+        with mock.patch.multiple(
+            warming, _executor=None, _limiter=None,
+            ThreadPoolExecutor=mock.DEFAULT, RateLimiter=mock.DEFAULT,
+        ) as mocks:
+            mocks['ThreadPoolExecutor'].side_effect = slow_pool
+            with ThreadPoolExecutor(10) as executor:
+                for _ in range(10):
+                    executor.submit(warming.schedule_warming, [])
+        self.assertEqual(mocks['ThreadPoolExecutor'].call_count, 1)
+        self.assertEqual(mocks['RateLimiter'].call_count, 1)
@@ -0,0 +1,75 @@
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.mail.backends.locmem import EmailBackend
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from ..digests import new_posts, send_digests
+from ..models import Digest, Follow, Post
+
+User = get_user_model()
+
+
+class FailingEmailBackend(EmailBackend):
+    def send_messages(self, messages):
+        raise OSError('Connection refused')
+
+
+@override_settings(
+    DIGEST_MAX_POSTS=2,
+    MAIL_QUEUE_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+)
+class DigestTest(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='author')
+        self.other = User.objects.create_user(username='other')
+        self.readers = [
+            User.objects.create_user(
+                username=f'reader{i}', email=f'reader{i}@example.com')
+            for i in range(3)
+        ]
+        for reader in self.readers:
+            Follow.objects.create(user=reader, author=self.author)
+        Follow.objects.create(user=self.readers[0], author=self.other)
+        User.objects.create_user(username='silent')
+        self.posts = [
+            Post.objects.create(text=f'Post {i}', author=self.author)
+            for i in range(3)
+        ]
+
+    def test_digests_in_chunks(self):
+        """Each reader gets new posts once, users come in chunks."""
+        Post.objects.create(text='Other post', author=self.other)
+        with self.assertNumQueries(4 * 2 + 1):
+            self.assertEqual(send_digests(chunk_size=2), 3)
+        self.assertEqual(
+            sorted(message.to[0] for message in mail.outbox),
+            [f'reader{i}@example.com' for i in range(3)],
+        )
+        body = mail.outbox[0].body
+        self.assertIn('Other post', body)
+        self.assertIn('И ещё записей: 2', body)
+        self.assertEqual(Digest.objects.count(), 3)
+        mail.outbox.clear()
+        self.assertEqual(send_digests(), 0)
+
+    def test_only_posts_after_last_digest(self):
+        """Posts older than the last digest are not sent again."""
+        reader = self.readers[1]
+        Digest.objects.create(user=reader, sent_at=timezone.now())
+        new = Post.objects.create(text='New', author=self.author)
+        now = timezone.now() + timedelta(seconds=1)
+        posts = new_posts([reader.id], now)
+        self.assertEqual([post[0] for post in posts[reader.id]], [new.id])
+
+    def test_failed_chunk_not_marked(self):
+        """Digests that were not delivered are sent again next time."""
+        with override_settings(
+            MAIL_QUEUE_BACKEND='posts.tests.test_digests.FailingEmailBackend'
+        ), self.assertLogs('posts.digests', 'ERROR'):
+            self.assertEqual(send_digests(), 0)
+        self.assertFalse(Digest.objects.exists())
+        self.assertEqual(send_digests(), 3)
+        self.assertEqual(Digest.objects.count(), 3)
@@ -0,0 +1,129 @@
+import json
+import tempfile
+import time
+from http import HTTPStatus
+
+from core.pubsub import LocalBroker, SocketBroker, get_broker
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from ..events import post_event
+from ..models import Follow, Group, Post
+
+User = get_user_model()
+
+
+class BrokerTest(TestCase):
+    def test_local_broker_filters_events(self):
+        """Subscribers get only events accepted by their predicate."""
+        broker = LocalBroker()
+        everything = broker.subscribe()
+        cats = broker.subscribe(lambda event: event['group'] == 'cats')
+        broker.publish({'id': 1, 'group': 'dogs'})
+        broker.publish({'id': 2, 'group': 'cats'})
+        self.assertEqual(everything.get(timeout=0)['id'], 1)
+        self.assertEqual(everything.get(timeout=0)['id'], 2)
+        self.assertEqual(cats.get(timeout=0)['id'], 2)
+        self.assertIsNone(cats.get(timeout=0))
+        cats.close()
+        broker.publish({'id': 3, 'group': 'cats'})
+        self.assertIsNone(cats.get(timeout=0))
+
+    def test_socket_broker_between_brokers(self):
+        """Event published by one broker reaches the others."""
+        with tempfile.TemporaryDirectory() as directory:
+            publisher = SocketBroker(directory)
+            publisher.close()
+            receiver = SocketBroker(directory)
+            subscription = receiver.subscribe()
+            try:
+                publisher.publish({'id': 1, 'group': None})
+                self.assertEqual(subscription.get(timeout=5)['id'], 1)
+            finally:
+                receiver.close()
+
+
+@override_settings(EVENTS_HEARTBEAT=0.05, EVENTS_ENABLED=True)
+class PostEventsViewTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='auth')
+        self.author = User.objects.create_user(username='author')
+        self.group = Group.objects.create(
+            title='Test group',
+            slug='test-slug',
+            description='Test description',
+        )
+        self.guest_client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def events(self, client, query=''):
+        response = client.get(reverse('posts:events') + query)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.addCleanup(response.close)
+        chunks = (chunk.decode() for chunk in response.streaming_content)
+        self.assertTrue(next(chunks).startswith('retry:'))
+        return chunks
+
+    def next_event(self, chunks):
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline:
+            chunk = next(chunks)
+            if not chunk.startswith(':'):
+                return json.loads(chunk.split('data: ', 1)[1])
+        self.fail('No event')
+
+    def test_group_stream(self):
+        """Group stream sends only posts of the group."""
+        chunks = self.events(self.guest_client, '?group=test-slug')
+        other = Post.objects.create(text='Other', author=self.author)
+        post = Post.objects.create(
+            text='Text', author=self.author, group=self.group)
+        get_broker().publish(post_event(other))
+        get_broker().publish(post_event(post))
+        self.assertEqual(self.next_event(chunks)['id'], post.id)
+
+    def test_follow_stream(self):
+        """Follow stream sends posts of followed authors."""
+        Follow.objects.create(user=self.user, author=self.author)
+        chunks = self.events(self.authorized_client, '?feed=follow')
+        own = Post.objects.create(text='Own', author=self.user)
+        post = Post.objects.create(text='Text', author=self.author)
+        get_broker().publish(post_event(own))
+        get_broker().publish(post_event(post))
+        event = self.next_event(chunks)
+        self.assertEqual(event['id'], post.id)
+        self.assertEqual(event['url'], reverse(
+            'posts:post_detail', args=[post.id]))
+
+    def test_heartbeat(self):
+        """Stream sends comments while there are no events."""
+        chunks = self.events(self.guest_client)
+        self.assertEqual(next(chunks), ': ping\n\n')
+
+    def test_follow_stream_for_guest(self):
+        """Guest can not subscribe to the follow feed."""
+        response = self.guest_client.get(
+            reverse('posts:events') + '?feed=follow')
+        self.assertEqual(response.status_code, HTTPStatus.FORBIDDEN)
+
+
+class LiveUpdatesSwitchTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    @override_settings(EVENTS_ENABLED=False)
+    def test_disabled(self):
+        """Without events feeds open no stream and the stream is empty."""
+        response = self.client.get(reverse('posts:events'))
+        self.assertEqual(response.status_code, HTTPStatus.NO_CONTENT)
+        response = self.client.get(reverse('posts:index'))
+        self.assertNotContains(response, 'EventSource')
+
+    @override_settings(EVENTS_ENABLED=True)
+    def test_enabled(self):
+        """With events feeds subscribe to the stream."""
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'EventSource')
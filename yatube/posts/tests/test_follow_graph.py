@@ -0,0 +1,86 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.test import (Client, TestCase, TransactionTestCase,
+                         override_settings)
+from django.urls import reverse
+
+from ..follow_graph import FollowGraph, get_graph, reset_graph
+from ..models import Follow, FollowChange, Post
+
+User = get_user_model()
+
+
+class FollowGraphTest(TestCase):
+    def setUp(self):
+        self.graph = FollowGraph()
+        self.graph.load([(1, 2), (2, 1), (1, 3), (3, 2)])
+
+    def test_lookups(self):
+        """Graph answers follows, followers and mutual follows."""
+        self.assertTrue(self.graph.follows(1, 3))
+        self.assertFalse(self.graph.follows(3, 1))
+        self.assertEqual(list(self.graph.following(1)), [2, 3])
+        self.assertEqual(list(self.graph.followers(2)), [1, 3])
+        self.assertEqual(self.graph.mutual(1), [2])
+        self.assertEqual(self.graph.edges, 4)
+
+    def test_changes(self):
+        """Added and removed follows are seen at once."""
+        self.graph.add(3, 1)
+        self.graph.add(3, 1)
+        self.graph.remove(1, 2)
+        self.graph.remove(1, 2)
+        self.assertEqual(self.graph.mutual(1), [3])
+        self.assertEqual(list(self.graph.followers(2)), [3])
+        self.assertEqual(self.graph.edges, 4)
+
+
+@override_settings(FOLLOW_GRAPH=True)
+class FollowGraphViewsTest(TransactionTestCase):
+    """Runs transactions to the end, graphs change on commit."""
+
+    def setUp(self):
+        cache.clear()
+        reset_graph()
+        self.addCleanup(reset_graph)
+        self.user = User.objects.create_user(username='reader')
+        self.author = User.objects.create_user(username='author')
+        self.post = Post.objects.create(text='Text', author=self.author)
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def test_graph_follows_views(self):
+        """Follow and unfollow update the graph and the pages."""
+        graph = get_graph()
+        self.client.get(reverse('posts:profile_follow', args=['author']))
+        self.assertTrue(graph.follows(self.user.id, self.author.id))
+        response = self.client.get(reverse('posts:follow_index'))
+        self.assertEqual(list(response.context['page_obj']), [self.post])
+        response = self.client.get(reverse('posts:profile', args=['author']))
+        self.assertContains(response, 'Отписаться')
+        self.client.get(reverse('posts:profile_unfollow', args=['author']))
+        self.assertFalse(graph.follows(self.user.id, self.author.id))
+        response = self.client.get(reverse('posts:follow_index'))
+        self.assertEqual(len(response.context['page_obj']), 0)
+
+    def test_graph_is_loaded_from_database(self):
+        """Graph built on first use has the saved follows."""
+        Follow.objects.create(user=self.user, author=self.author)
+        reset_graph()
+        self.assertEqual(
+            list(get_graph().followers(self.author.id)), [self.user.id])
+
+    @override_settings(FOLLOW_GRAPH_SYNC=0)
+    def test_changes_of_other_processes(self):
+        """Logged changes are applied, rolled back ones never reach."""
+        graph = get_graph()
+        FollowChange.objects.create(
+            user_id=self.user.id, author_id=self.author.id, followed=True)
+        self.assertIs(get_graph(), graph)
+        self.assertTrue(graph.follows(self.user.id, self.author.id))
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            Follow.objects.create(user=self.author, author=self.user)
+            raise RuntimeError
+        get_graph()
+        self.assertFalse(graph.follows(self.author.id, self.user.id))
@@ -1,3 +1,4 @@
+import hashlib
 import shutil
 import tempfile
 from http import HTTPStatus
@@ -71,9 +72,9 @@ class PostFormTest(TestCase):
         self.assertEqual(Post.objects.count(), posts_count + 1)
         last_object = response.context['page_obj'][0]
         self.assertEqual(last_object.text, form_data['text'])
-        self.assertTrue(last_object.image.name.endswith(
-            form_data['image'].name)
-        )
+        digest = hashlib.sha256(image).hexdigest()
+        self.assertEqual(
+            last_object.image.name, f'posts/{digest[:2]}/{digest[2:]}.jpg')
 
     def test_create_group_post(self):
         """Valid form creates post in Post."""
@@ -0,0 +1,56 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import Group, Post
+from ..signals import posts_created
+
+User = get_user_model()
+
+
+class GroupStatsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='auth')
+        self.cats = Group.objects.create(
+            title='Cats', slug='cats', description='Cats')
+        self.dogs = Group.objects.create(
+            title='Dogs', slug='dogs', description='Dogs')
+        self.client = Client()
+
+    def assertStats(self, group, count, last_post):
+        group.refresh_from_db()
+        self.assertEqual(group.posts_count, count)
+        self.assertEqual(
+            group.last_post_at, last_post and last_post.pub_date)
+
+    def test_stats_follow_posts(self):
+        """Counts and last posts follow new, moved and deleted posts."""
+        first = Post.objects.create(
+            text='First', author=self.user, group=self.cats)
+        second = Post.objects.create(
+            text='Second', author=self.user, group=self.cats)
+        self.assertStats(self.cats, 2, second)
+        second.group = self.dogs
+        second.save()
+        self.assertStats(self.cats, 1, first)
+        self.assertStats(self.dogs, 1, second)
+        second.delete()
+        self.assertStats(self.dogs, 0, None)
+        posts = Post.objects.bulk_create(
+            [Post(text='Bulk', author=self.user, group=self.dogs)] * 3)
+        posts_created(self.user, posts)
+        self.assertEqual(Group.objects.get(pk=self.dogs.pk).posts_count, 3)
+
+    def test_group_directory(self):
+        """Directory lists recently active groups first."""
+        url = reverse('posts:groups')
+        response = self.client.get(url)
+        self.assertEqual(
+            list(response.context['page_obj']), [self.cats, self.dogs])
+        Post.objects.create(text='Woof', author=self.user, group=self.dogs)
+        response = self.client.get(url)
+        self.assertEqual(
+            list(response.context['page_obj']), [self.dogs, self.cats])
+        self.assertContains(response, 'Записей: 1')
@@ -0,0 +1,168 @@
+import os
+import shutil
+import tempfile
+import time
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from sorl.thumbnail import get_thumbnail
+
+from ..models import Post
+
+User = get_user_model()
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+OTHER_GIF = SMALL_GIF.replace(b'\xFF\xFF\xFF', b'\x00\x00\xFF')
+
+
+def upload(content, name='meme.GIF'):
+    return SimpleUploadedFile(name, content, content_type='image/gif')
+
+
+class ContentAddressedImagesTest(TransactionTestCase):
+    """Runs transactions to the end, images are released on commit."""
+
+    def setUp(self):
+        cache.clear()
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.settings = override_settings(
+            MEDIA_ROOT=self.root, GC_MEDIA_MIN_AGE=0)
+        self.settings.enable()
+        self.addCleanup(self.settings.disable)
+        self.user = User.objects.create_user(username='auth')
+
+    def exists(self, name):
+        return os.path.exists(os.path.join(self.root, name))
+
+    def test_identical_uploads_share_file(self):
+        """Same content is stored once and kept while a post uses it."""
+        first = Post.objects.create(
+            text='First', author=self.user, image=upload(SMALL_GIF))
+        second = Post.objects.create(
+            text='Second', author=self.user,
+            image=upload(SMALL_GIF, 'copy.gif'))
+        name = first.image.name
+        self.assertEqual(second.image.name, name)
+        self.assertTrue(name.endswith('.gif'))
+        self.assertEqual(
+            len(os.listdir(os.path.dirname(os.path.join(self.root, name)))),
+            1)
+        thumbnail = get_thumbnail(first.image, '10x10').name
+        self.assertEqual(get_thumbnail(second.image, '10x10').name, thumbnail)
+        first.delete()
+        self.assertTrue(self.exists(name))
+        second.delete()
+        self.assertFalse(self.exists(name))
+        self.assertFalse(self.exists(thumbnail))
+
+    def test_replaced_image_is_released(self):
+        """Image replaced on edit is deleted once unused."""
+        post = Post.objects.create(
+            text='Text', author=self.user, image=upload(SMALL_GIF))
+        old = post.image.name
+        post = Post.objects.get(pk=post.pk)
+        post.image = upload(OTHER_GIF)
+        post.save()
+        self.assertFalse(self.exists(old))
+        self.assertTrue(self.exists(post.image.name))
+        self.user.delete()
+        self.assertFalse(self.exists(post.image.name))
+
+    @override_settings(GC_MEDIA_MIN_AGE=3600)
+    def test_fresh_image_is_kept(self):
+        """Image just uploaded again may get a post, gc_media removes it."""
+        post = Post.objects.create(
+            text='Text', author=self.user, image=upload(SMALL_GIF))
+        name = post.image.name
+        os.utime(os.path.join(self.root, name), (0, 0))
+        upload_again = Post(text='Again', author=self.user)
+        upload_again.image.save('meme.gif', upload(SMALL_GIF), save=False)
+        post.delete()
+        self.assertTrue(self.exists(name))
+
+
+class GarbageCollectionTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.settings = override_settings(MEDIA_ROOT=self.root)
+        self.settings.enable()
+        self.addCleanup(self.settings.disable)
+        user = User.objects.create_user(username='auth')
+        self.kept = Post.objects.create(
+            text='Kept', author=user, image=upload(SMALL_GIF))
+        orphan = Post.objects.create(
+            text='Orphan', author=user, image=upload(OTHER_GIF))
+        self.orphan = orphan.image.name
+        self.thumbnails = [
+            get_thumbnail(post.image, '10x10').name
+            for post in (self.kept, orphan)
+        ]
+        # Replaced without signals, as by an update of many rows
+        Post.objects.filter(pk=orphan.pk).update(image='')
+        self.stale = 'cache/00/00/stale.jpg'
+        os.makedirs(os.path.join(self.root, 'cache/00/00'))
+        open(os.path.join(self.root, self.stale), 'wb').close()
+
+    def exists(self, name):
+        return os.path.exists(os.path.join(self.root, name))
+
+    def gc_media(self, *args):
+        output = StringIO()
+        call_command('gc_media', *args, stdout=output)
+        return output.getvalue().strip()
+
+    def test_dry_run(self):
+        """Dry run counts files and keys without removing them."""
+        self.assertEqual(
+            self.gc_media('--dry-run', '--min-age=0'),
+            '3 files and 3 thumbnail store keys to remove',
+        )
+        self.assertTrue(self.exists(self.orphan))
+
+    def test_fresh_records_kept(self):
+        """Records of fresh images stay, with their thumbnails."""
+        self.assertEqual(
+            self.gc_media('--min-age=3600'),
+            '0 files and 0 thumbnail store keys removed',
+        )
+        self.assertTrue(self.exists(self.orphan))
+        self.assertTrue(self.exists(self.thumbnails[1]))
+        # Thumbnails of dropped records go with them, fresh files stay
+        past = time.time() - 7200
+        os.utime(os.path.join(self.root, self.orphan), (past, past))
+        self.assertEqual(
+            self.gc_media('--min-age=3600'),
+            '2 files and 3 thumbnail store keys removed',
+        )
+        self.assertFalse(self.exists(self.orphan))
+        self.assertFalse(self.exists(self.thumbnails[1]))
+        self.assertTrue(self.exists(self.stale))
+
+    def test_unreferenced_files_removed(self):
+        """Orphans and stale thumbnails go, images in use stay."""
+        self.assertEqual(
+            self.gc_media('--min-age=0', '--batch=2'),
+            '3 files and 3 thumbnail store keys removed',
+        )
+        for name in (self.orphan, self.thumbnails[1], self.stale):
+            self.assertFalse(self.exists(name))
+        self.assertTrue(self.exists(self.kept.image.name))
+        self.assertTrue(self.exists(self.thumbnails[0]))
+        self.assertEqual(
+            self.gc_media('--min-age=0'),
+            '0 files and 0 thumbnail store keys removed',
+        )
@@ -0,0 +1,92 @@
+import warnings
+from http import HTTPStatus
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.cache.backends.base import CacheKeyWarning
+from django.http import Http404
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from .. import lookups
+from ..models import Group
+
+User = get_user_model()
+
+
+class LRUCacheTest(TestCase):
+    def test_bounded_and_expiring(self):
+        """Least recently used entries go first, old ones expire."""
+        lru = lookups.LRUCache(size=2, timeout=10)
+        lru.set('a', 1)
+        lru.set('b', 2)
+        lru.get('a')
+        lru.set('c', 3)
+        self.assertEqual((lru.get('a'), lru.get('b')), (1, None))
+        with mock.patch('time.monotonic', return_value=10 ** 9):
+            self.assertIsNone(lru.get('c'))
+
+
+class LookupTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        lookups._local.clear()
+        self.user = User.objects.create_user(
+            username='auth', first_name='Ivan')
+        self.author = User.objects.create_user(username='author')
+        self.group = Group.objects.create(
+            title='Cats', slug='cats', description='About cats')
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def test_lookup_skips_query(self):
+        """Looked up rows are served from the cache."""
+        lookups.user_by_username('auth')
+        lookups.group_by_slug('cats')
+        with self.assertNumQueries(0):
+            user = lookups.user_by_username('auth')
+            group = lookups.group_by_slug('cats')
+        lookups._local.clear()
+        with self.assertNumQueries(0):
+            group = lookups.group_by_slug('cats')
+        self.assertEqual((user, user.get_full_name()), (self.user, 'Ivan'))
+        self.assertEqual(
+            (group, group.description), (self.group, 'About cats'))
+        # Other fields are loaded on access
+        self.assertEqual(user.email, '')
+
+    def test_follow_without_lookup_query(self):
+        """Follow resolves the author from the cache."""
+        url = reverse('posts:profile_follow', args=['author'])
+        self.client.get(url)
+        self.client.get(reverse('posts:profile_unfollow', args=['author']))
+        with self.assertNumQueries(0):
+            lookups.user_by_username('author')
+
+    def test_renamed_rows_are_forgotten(self):
+        """Old names stop resolving, new ones resolve at once."""
+        lookups.group_by_slug('cats')
+        lookups.user_by_username('author')
+        self.group.slug = 'kittens'
+        self.group.save()
+        self.author.username = 'writer'
+        self.author.save()
+        response = self.client.get(reverse('posts:group_list', args=['cats']))
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+        self.assertEqual(lookups.group_by_slug('kittens'), self.group)
+        response = self.client.get(
+            reverse('posts:profile', args=['author']))
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+        self.assertEqual(lookups.user_by_username('writer'), self.author)
+
+    def test_keys_suit_memcached(self):
+        """Names with spaces or too long for a key are looked up."""
+        name = 'foo bar\n' + 'x' * 300
+        with warnings.catch_warnings():
+            warnings.simplefilter('error', CacheKeyWarning)
+            with self.assertRaises(Http404):
+                lookups.user_by_username(name)
+            self.author.username = name
+            self.author.save()
+            self.assertEqual(lookups.user_by_username(name), self.author)
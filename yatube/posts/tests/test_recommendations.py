@@ -0,0 +1,63 @@
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..follow_graph import FollowGraph
+from ..models import Follow, Recommendation
+from ..recommendations import rebuild, recommend
+
+User = get_user_model()
+
+
+class RecommendTest(TestCase):
+    def test_friends_of_friends_and_co_follows(self):
+        """Authors of followed authors and their readers are ranked."""
+        graph = FollowGraph()
+        graph.load([
+            (1, 2), (2, 3), (2, 4),
+            (5, 2), (5, 4), (5, 6),
+        ])
+        best = recommend(graph, 1, top=10, sample=50)
+        self.assertEqual([author for author, _ in best], [4, 3, 6])
+        self.assertEqual(recommend(graph, 1, top=1, sample=50), [best[0]])
+        self.assertNotIn(2, dict(recommend(graph, 5, top=10, sample=50)))
+
+
+class RebuildTest(TestCase):
+    def setUp(self):
+        self.reader = User.objects.create_user(username='reader')
+        self.friend = User.objects.create_user(username='friend')
+        self.author = User.objects.create_user(username='author')
+        Follow.objects.create(user=self.reader, author=self.friend)
+        Follow.objects.create(user=self.friend, author=self.author)
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def test_rebuild_saves_recommendations(self):
+        """Recommendations are saved by one process or a pool."""
+        for workers in (1, 2):
+            with self.subTest(workers=workers):
+                self.assertEqual(rebuild(workers=workers), 2)
+                self.assertEqual(
+                    list(Recommendation.objects.filter(
+                        user=self.reader).values_list('author', 'rank')),
+                    [(self.author.id, 0)],
+                )
+
+    def test_stale_recommendations_removed(self):
+        """Users who follow nobody any more lose recommendations."""
+        rebuild(workers=1)
+        Follow.objects.filter(user=self.reader).delete()
+        rebuild(workers=1)
+        self.assertFalse(
+            Recommendation.objects.filter(user=self.reader).exists())
+
+    def test_follow_page_shows_recommendations(self):
+        """Follow page links recommended authors until followed."""
+        rebuild(workers=1)
+        url = reverse('posts:profile', args=['author'])
+        response = self.client.get(reverse('posts:follow_index'))
+        self.assertContains(response, f'href="{url}"')
+        self.client.get(reverse('posts:profile_follow', args=['author']))
+        response = self.client.get(reverse('posts:follow_index'))
+        self.assertNotContains(response, f'href="{url}"')
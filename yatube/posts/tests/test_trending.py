@@ -0,0 +1,98 @@
+import threading
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from .. import counters, trending
+from ..models import Comment, Group, GroupTrend, Post, PostTrend
+
+User = get_user_model()
+
+
+class TrendingCounterTest(TestCase):
+    def test_later_points_are_worth_more(self):
+        """A point earned a half-life later counts twice."""
+        counter = trending.TrendingCounter()
+        start = counter.epoch
+        counter.add(1, 1, now=start)
+        counter.add(2, 1, now=start + settings.TRENDING_HALF_LIFE)
+        scores, epoch = counter.take()
+        self.assertEqual(epoch, start)
+        self.assertEqual(scores, {1: 1, 2: 2})
+        self.assertEqual(counter.take()[0], {})
+
+    @override_settings(TRENDING_FLUSH_INTERVAL=0.01)
+    def test_quiet_counter_is_flushed(self):
+        """Timer flushes points without waiting for the next one."""
+        counter = trending.TrendingCounter()
+        flushed = threading.Event()
+
+        def flush():
+            counter.take()
+            counter.flushing = False
+            flushed.set()
+
+        counter.add(1, 1)
+        counters.start_flush_timer(counter, flush, 'TRENDING_FLUSH_INTERVAL')
+        self.assertTrue(flushed.wait(timeout=5))
+        self.assertEqual(counter.take()[0], {})
+
+    @override_settings(COUNTERS_FLUSH_IN_BACKGROUND=True)
+    def test_record_starts_timer(self):
+        """Counting in background starts the timer of the process."""
+        with mock.patch.object(trending, 'start_flush_timer') as timer:
+            trending.record(1, 1)
+        timer.assert_called_once_with(
+            trending._counter, trending.flush, 'TRENDING_FLUSH_INTERVAL')
+        trending._counter.take()
+
+
+@override_settings(TRENDING_VIEW_SAMPLE=1)
+class TrendingTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        trending._counter.take()
+        self.user = User.objects.create_user(username='auth')
+        self.group = Group.objects.create(
+            title='Test group',
+            slug='test-slug',
+            description='Test description',
+        )
+        self.post = Post.objects.create(
+            text='Post', author=self.user, group=self.group)
+        self.other = Post.objects.create(text='Other', author=self.user)
+        self.client = Client()
+
+    def test_flush_adds_scores(self):
+        """Flushed scores are added to the post and its group."""
+        for _ in range(2):
+            trending.save_scores({self.post.id: 1}, trending.current_epoch())
+        self.assertEqual(PostTrend.objects.get(post=self.post).score, 2)
+        self.assertEqual(GroupTrend.objects.get(group=self.group).score, 2)
+
+    def test_old_epochs_decay(self):
+        """Scores of a past epoch are moved to the current one."""
+        epoch = trending.current_epoch()
+        old = epoch - settings.TRENDING_HALF_LIFE
+        PostTrend.objects.create(post=self.post, score=4, epoch=old)
+        trending.save_scores({self.other.id: 1}, epoch)
+        trend = PostTrend.objects.get(post=self.post)
+        self.assertEqual((trend.score, trend.epoch), (2, epoch))
+
+    def test_trending_page(self):
+        """Comments and views rank posts on the trending page."""
+        url = reverse('posts:trending')
+        self.assertEqual(
+            len(self.client.get(url).context['page_obj']), 0)
+        Comment.objects.create(post=self.post, author=self.user, text='Hi')
+        self.client.get(reverse('posts:post_detail', args=[self.other.id]))
+        self.client.get(reverse('posts:post_detail', args=[self.post.id]))
+        trending.flush()
+        response = self.client.get(url)
+        self.assertEqual(
+            list(response.context['page_obj']), [self.post, self.other])
+        self.assertEqual(list(response.context['groups']), [self.group])
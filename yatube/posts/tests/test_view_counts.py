@@ -0,0 +1,74 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from .. import view_counts
+from ..models import Post, PostViewers
+
+User = get_user_model()
+
+
+class HyperLogLogTest(TestCase):
+    def test_estimate(self):
+        """Estimates of small and large counts are close, merge unites."""
+        first = view_counts.HyperLogLog(10)
+        second = view_counts.HyperLogLog(10)
+        self.assertEqual(first.estimate(), 0)
+        for i in range(20):
+            first.add(f'user:{i}')
+        self.assertEqual(first.estimate(), 20)
+        for i in range(10000):
+            second.add(f'user:{i}')
+        self.assertAlmostEqual(second.estimate(), 10000, delta=1000)
+        first.merge(second.registers)
+        self.assertEqual(first.registers, second.registers)
+
+
+class ViewCountsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        view_counts._counter.take()
+        self.user = User.objects.create_user(username='auth')
+        self.post = Post.objects.create(text='Post', author=self.user)
+        self.url = reverse('posts:post_detail', args=[self.post.id])
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def test_views_are_flushed_in_batches(self):
+        """Views, cached ones too, reach the database on flush."""
+        self.client.get(self.url)
+        self.client.get(self.url)
+        Client().get(self.url)
+        self.assertEqual(Post.objects.get(pk=self.post.pk).views, 0)
+        with self.assertNumQueries(7):
+            view_counts.flush()
+        self.client.get(self.url)
+        view_counts.flush()
+        post = Post.objects.get(pk=self.post.pk)
+        self.assertEqual(post.views, 4)
+        self.assertEqual(view_counts.unique_viewers(post), 2)
+
+    def test_deleted_posts_are_skipped(self):
+        """Views of a post deleted before the flush are dropped."""
+        self.client.get(self.url)
+        self.post.delete()
+        view_counts.flush()
+        self.assertFalse(PostViewers.objects.exists())
+
+    @override_settings(COUNTERS_FLUSH_IN_BACKGROUND=True)
+    def test_views_start_timer(self):
+        """Counting in background starts the timer of the process."""
+        with mock.patch.object(view_counts, 'start_flush_timer') as timer:
+            with mock.patch.object(view_counts, 'start_flush'):
+                self.client.get(self.url)
+        timer.assert_called_once_with(
+            view_counts._counter, view_counts.flush,
+            'VIEW_COUNTS_FLUSH_INTERVAL')
+
+    def test_empty_flush_skips_queries(self):
+        """Timer flushes of a quiet site do not touch the database."""
+        with self.assertNumQueries(0):
+            view_counts.flush()
@@ -0,0 +1,151 @@
+import random
+import threading
+import time
+from functools import wraps
+from http import HTTPStatus
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+
+from .caching import bump
+from .counters import (
+    UPDATE_BATCH, increment, start_flush, start_flush_timer)
+from .models import GroupTrend, Post, PostTrend
+
+
+def current_epoch(now=None):
+    """Start of the epoch the scores are counted from, in seconds."""
+    now = time.time() if now is None else now
+    return int(now - now % settings.TRENDING_EPOCH)
+
+
+def growth(seconds):
+    """Worth of a point earned `seconds` later than another one."""
+    return 2 ** (seconds / settings.TRENDING_HALF_LIFE)
+
+
+class TrendingCounter:
+    """Engagement of posts since the last flush.
+
+    Points grow with time instead of old points decaying, so adding one
+    is a single dict update. Scores are kept in units of the epoch.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.epoch = current_epoch()
+        self.scores = {}
+        self.flushed = time.monotonic()
+        self.flushing = False
+
+    def add(self, post_id, points, now=None):
+        """Count points of the post, True when a flush is due."""
+        now = time.time() if now is None else now
+        with self.lock:
+            self.scores[post_id] = self.scores.get(post_id, 0) + (
+                points * growth(now - self.epoch))
+            due = not self.flushing and (
+                time.monotonic() - self.flushed
+                >= settings.TRENDING_FLUSH_INTERVAL
+            )
+            if due:
+                self.flushing = True
+        return due
+
+    def take(self):
+        """Pending scores and their epoch, counting starts over."""
+        with self.lock:
+            scores, epoch = self.scores, self.epoch
+            self.scores = {}
+            self.epoch = current_epoch()
+            self.flushed = time.monotonic()
+        return scores, epoch
+
+
+_counter = TrendingCounter()
+
+
+def add_scores(model, scores, epoch):
+    """Add scores of the epoch to the rows, creating missing ones.
+
+    Rows of older epochs are moved to this one first, so all scores
+    can be compared.
+    """
+    old_epochs = model.objects.filter(epoch__lt=epoch).values_list(
+        'epoch', flat=True).distinct()
+    for old in list(old_epochs):
+        model.objects.filter(epoch=old).update(
+            score=F('score') * growth(old - epoch), epoch=epoch)
+    pk_name = model._meta.pk.attname
+    existing = increment(model.objects, 'score', scores)
+    model.objects.bulk_create(
+        [
+            model(**{pk_name: pk, 'score': score, 'epoch': epoch})
+            for pk, score in scores.items() if pk not in existing
+        ],
+        batch_size=settings.API_BULK_BATCH,
+        ignore_conflicts=True,
+    )
+
+
+def save_scores(scores, epoch):
+    """Add scores of posts and of their groups to the database."""
+    now_epoch = current_epoch()
+    factor = growth(epoch - now_epoch)
+    post_scores, group_scores = {}, {}
+    ids = list(scores)
+    for start in range(0, len(ids), UPDATE_BATCH):
+        rows = Post.objects.filter(
+            pk__in=ids[start:start + UPDATE_BATCH]
+        ).values_list('pk', 'group_id')
+        for pk, group_id in rows:
+            score = scores[pk] * factor
+            post_scores[pk] = score
+            if group_id is not None:
+                group_scores[group_id] = group_scores.get(
+                    group_id, 0) + score
+    with transaction.atomic():
+        add_scores(PostTrend, post_scores, now_epoch)
+        add_scores(GroupTrend, group_scores, now_epoch)
+
+
+def flush(counter=None):
+    """Add the counted engagement to the database."""
+    counter = counter or _counter
+    try:
+        scores, epoch = counter.take()
+        if scores:
+            save_scores(scores, epoch)
+            bump(('trending',))
+    finally:
+        counter.flushing = False
+
+
+def record(post_id, points):
+    """Count engagement of the post, flushing every few seconds."""
+    if settings.COUNTERS_FLUSH_IN_BACKGROUND:
+        start_flush_timer(_counter, flush, 'TRENDING_FLUSH_INTERVAL')
+    if _counter.add(post_id, points):
+        start_flush(flush)
+
+
+def count_views(view):
+    """Count a sampled share of views of the post, cached ones too.
+
+    Each counted view is worth 1 / TRENDING_VIEW_SAMPLE views, so
+    the expected score does not depend on the sampling rate.
+    """
+    @wraps(view)
+    def wrapper(request, post_id, **kwargs):
+        response = view(request, post_id=post_id, **kwargs)
+        if (
+            response.status_code in (HTTPStatus.OK, HTTPStatus.NOT_MODIFIED)
+            and random.random() < settings.TRENDING_VIEW_SAMPLE
+        ):
+            record(
+                post_id,
+                settings.TRENDING_VIEW_WEIGHT / settings.TRENDING_VIEW_SAMPLE,
+            )
+        return response
+    return wrapper
@@ -7,6 +7,10 @@ app_name = 'posts'
 urlpatterns = [
     # main page
     path('', views.index, name='index'),
+    # Most commented and viewed lately
+    path('trending/', views.trending_index, name='trending'),
+    # All groups, recently active first
+    path('groups/', views.group_index, name='groups'),
     # page for a certain group
     path('group/<slug:slug>/', views.group_posts, name='group_list'),
     # User profile
@@ -22,6 +26,8 @@ urlpatterns = [
         'posts/<int:post_id>/comment/',
         views.add_comment,
         name='add_comment'),
+    # Live updates of the feeds
+    path('events/', views.post_events, name='events'),
     # Follow path
     path('follow/', views.follow_index, name='follow_index'),
     path(
@@ -0,0 +1,184 @@
+import hashlib
+import math
+import threading
+import time
+from functools import wraps
+from http import HTTPStatus
+
+from django.conf import settings
+from django.db import transaction
+
+from .counters import (
+    UPDATE_BATCH, increment, start_flush, start_flush_timer)
+from .models import Post, PostViewers
+
+
+class HyperLogLog:
+    """Estimate of the number of distinct items in 2 ** p bytes.
+
+    An item sets the register chosen by the first p bits of its hash to
+    the position of the first one bit in the rest, if that is higher.
+    Sketches are merged by taking the larger registers.
+    """
+
+    def __init__(self, precision, registers=None):
+        self.precision = precision
+        size = 1 << precision
+        self.registers = bytearray(registers or size)
+
+    def add(self, item):
+        value = int.from_bytes(
+            hashlib.blake2b(item.encode(), digest_size=8).digest(), 'big')
+        bits = 64 - self.precision
+        index = value >> bits
+        rank = bits - (value & ((1 << bits) - 1)).bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, registers):
+        self.registers = bytearray(map(max, self.registers, registers))
+
+    def estimate(self):
+        size = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / size)
+        raw = alpha * size * size / sum(
+            2.0 ** -register for register in self.registers)
+        zeros = self.registers.count(0)
+        if raw <= 2.5 * size and zeros:
+            # Linear counting is better for small numbers
+            return round(size * math.log(size / zeros))
+        return round(raw)
+
+
+def unique_viewers(post):
+    """Estimated number of distinct viewers of the post."""
+    try:
+        registers = post.viewers.registers
+    except PostViewers.DoesNotExist:
+        return 0
+    return HyperLogLog(
+        settings.VIEW_COUNTS_HLL_PRECISION, registers).estimate()
+
+
+class ViewCounter:
+    """Views of posts since the last flush, in shards by post id.
+
+    Each shard has its own lock, so threads counting views of different
+    posts rarely wait for each other.
+    """
+
+    def __init__(self, shards):
+        self.locks = [threading.Lock() for _ in range(shards)]
+        self.counts = [{} for _ in range(shards)]
+        self.sketches = [{} for _ in range(shards)]
+        self.lock = threading.Lock()
+        self.flushed = time.monotonic()
+        self.flushing = False
+
+    def add(self, post_id, viewer=None):
+        """Count a view of the post, True when a flush is due."""
+        shard = post_id % len(self.locks)
+        with self.locks[shard]:
+            counts = self.counts[shard]
+            counts[post_id] = counts.get(post_id, 0) + 1
+            if viewer is not None:
+                sketch = self.sketches[shard].get(post_id)
+                if sketch is None:
+                    sketch = self.sketches[shard][post_id] = HyperLogLog(
+                        settings.VIEW_COUNTS_HLL_PRECISION)
+                sketch.add(viewer)
+        with self.lock:
+            due = not self.flushing and (
+                time.monotonic() - self.flushed
+                >= settings.VIEW_COUNTS_FLUSH_INTERVAL
+            )
+            if due:
+                self.flushing = True
+        return due
+
+    def take(self):
+        """Views and sketches of all shards, counting starts over."""
+        counts, sketches = {}, {}
+        for shard, lock in enumerate(self.locks):
+            with lock:
+                counts.update(self.counts[shard])
+                sketches.update(self.sketches[shard])
+                self.counts[shard] = {}
+                self.sketches[shard] = {}
+        with self.lock:
+            self.flushed = time.monotonic()
+        return counts, sketches
+
+
+_counter = ViewCounter(settings.VIEW_COUNTS_SHARDS)
+
+
+def save_sketches(sketches, posts):
+    """Merge sketches of viewers into the saved ones.
+
+    New rows are made only for existing posts, ids from `posts`. Rows
+    are made empty first and merged locked in the order of ids, within
+    the transaction of flush, so processes flushing at once do not
+    overwrite each other.
+    """
+    size = 1 << settings.VIEW_COUNTS_HLL_PRECISION
+    PostViewers.objects.bulk_create(
+        [
+            PostViewers(post_id=pk, registers=bytes(size))
+            for pk in sketches if pk in posts
+        ],
+        batch_size=UPDATE_BATCH,
+        ignore_conflicts=True,
+    )
+    ids = sorted(sketches)
+    saved = []
+    for start in range(0, len(ids), UPDATE_BATCH):
+        saved += PostViewers.objects.filter(
+            pk__in=ids[start:start + UPDATE_BATCH]
+        ).order_by('post_id').select_for_update()
+    for row in saved:
+        sketch = sketches[row.pk]
+        sketch.merge(row.registers)
+        row.registers = bytes(sketch.registers)
+    PostViewers.objects.bulk_update(
+        saved, ['registers'], batch_size=UPDATE_BATCH)
+
+
+def flush(counter=None):
+    """Add the counted views to the database."""
+    counter = counter or _counter
+    try:
+        counts, sketches = counter.take()
+        if not counts:
+            return
+        with transaction.atomic():
+            posts = increment(Post.objects, 'views', counts)
+            if sketches:
+                save_sketches(sketches, posts)
+    finally:
+        counter.flushing = False
+
+
+def viewer_id(request):
+    """Who views the page: the user or, for guests, the address."""
+    if request.user.is_authenticated:
+        return f'user:{request.user.id}'
+    return 'ip:{}'.format(request.META.get('REMOTE_ADDR', ''))
+
+
+def count_views(view):
+    """Count views of the post, cached ones too."""
+    @wraps(view)
+    def wrapper(request, post_id, **kwargs):
+        response = view(request, post_id=post_id, **kwargs)
+        if response.status_code in (HTTPStatus.OK, HTTPStatus.NOT_MODIFIED):
+            viewer = (
+                viewer_id(request) if settings.VIEW_COUNTS_UNIQUE else None
+            )
+            if settings.COUNTERS_FLUSH_IN_BACKGROUND:
+                start_flush_timer(
+                    _counter, flush, 'VIEW_COUNTS_FLUSH_INTERVAL')
+            if _counter.add(post_id, viewer):
+                start_flush(flush)
+        return response
+    return wrapper
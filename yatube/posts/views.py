@@ -1,35 +1,43 @@
 import os
+from http import HTTPStatus
 
 from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.core.paginator import Paginator
+from django.http import HttpResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
-from django.views.decorators.cache import cache_page
+from django.views.decorators.vary import vary_on_cookie
 
+from . import events, lookups, queries, trending, view_counts
+from .caching import cached_page
 from .forms import CommentForm, PostForm
-from .models import Comment, Follow, Group, Post, User
+from .models import Follow, Post
 
 PATH_TO_INDEX = os.path.join('posts', 'index.html')
 PATH_TO_GROUP_LIST = os.path.join('posts', 'group_list.html')
+PATH_TO_GROUPS = os.path.join('posts', 'groups.html')
 PATH_TO_PROFILE = os.path.join('posts', 'profile.html')
 PATH_TO_POST = os.path.join('posts', 'post_detail.html')
 PATH_TO_CREATE_POST = os.path.join('posts', 'create_post.html')
 PATH_TO_FOLLOW = os.path.join('posts', 'follow.html')
+PATH_TO_TRENDING = os.path.join('posts', 'trending.html')
 
 
-def page_maker(post_list, request):
-    """Return paginator."""
+def page_maker(post_list, request, count=None):
+    """Return paginator, a known count saves the COUNT query."""
     paginator = Paginator(post_list, settings.POSTS_IN_PAGINATOR)
+    if count is not None:
+        paginator.count = count
     page_number = request.GET.get('page')
     return paginator.get_page(page_number)
 
 
-@cache_page(settings.CACHING_TIME)
+@vary_on_cookie
+@cached_page(settings.CACHING_TIME, 'index')
 def index(request):
     """Returns main page."""
     template = PATH_TO_INDEX
-    post_list = Post.objects.select_related(
-        'group', 'author').all()
+    post_list = queries.feed().select_related('group', 'author')
     title = 'Main page for project Yatube'
     context = {
         'title': title,
@@ -38,11 +46,39 @@ def index(request):
     return render(request, template, context)
 
 
+@vary_on_cookie
+@cached_page(settings.CACHING_TIME, 'trending')
+def trending_index(request):
+    """Returns page of trending posts and groups."""
+    template = PATH_TO_TRENDING
+    post_list = queries.trending_posts().select_related('group', 'author')
+    context = {
+        'groups': queries.trending_groups()[:settings.TRENDING_GROUPS],
+        'page_obj': page_maker(request=request, post_list=post_list),
+    }
+    return render(request, template, context)
+
+
+@vary_on_cookie
+@cached_page(settings.PAGE_CACHING_TIME, 'groups')
+def group_index(request):
+    """Returns directory of groups, recently active first."""
+    template = PATH_TO_GROUPS
+    group_list = queries.groups_by_activity()
+    context = {
+        'page_obj': page_maker(request=request, post_list=group_list),
+    }
+    return render(request, template, context)
+
+
+@vary_on_cookie
+@cached_page(settings.PAGE_CACHING_TIME, 'group', 'slug')
 def group_posts(request, slug):
     """Returns group page."""
     template = PATH_TO_GROUP_LIST
-    group = get_object_or_404(Group, slug=slug)
-    post_list = group.posts.select_related('group', 'author').all()
+    group = lookups.group_by_slug(slug)
+    post_list = queries.group_feed(group.id).select_related(
+        'group', 'author')
     context = {
         'group': group,
         'page_obj': page_maker(request=request, post_list=post_list)
@@ -50,36 +86,47 @@ def group_posts(request, slug):
     return render(request, template, context)
 
 
+@vary_on_cookie
+@cached_page(settings.PAGE_CACHING_TIME, 'profile', 'username')
 def profile(request, username):
     """Model and the creation of the context dict for user."""
     template = PATH_TO_PROFILE
-    author = get_object_or_404(User, username=username)
-    post_list = author.posts.select_related('group', 'author').all()
-    following = request.user.is_authenticated and Follow.objects.filter(
-        user=request.user, author=author
-    ).exists()
+    author = lookups.user_by_username(username)
+    post_list = queries.author_feed(author.id).select_related(
+        'group', 'author')
+    posts_count = author.posts.count()
     context = {
         'author': author,
-        'posts_count': author.posts.count(),
-        'page_obj': page_maker(request=request, post_list=post_list),
-        'following': following,
+        'posts_count': posts_count,
+        'page_obj': page_maker(
+            request=request, post_list=post_list, count=posts_count),
     }
     return render(request, template, context)
 
 
+def author_scope(kwargs):
+    """Post page shows the number of posts of the author."""
+    return [('author', lookups.post_by_id(kwargs['post_id']).author_id)]
+
+
+@view_counts.count_views
+@trending.count_views
+@vary_on_cookie
+@cached_page(settings.PAGE_CACHING_TIME, 'post', 'post_id',
+             extra_scopes=author_scope)
 def post_detail(request, post_id):
     """Model and the creation of the context dict for posts."""
     template = PATH_TO_POST
     post = get_object_or_404(Post, pk=post_id)
     author = post.author
+    viewers = view_counts.unique_viewers(post)
     posts_count = author.posts.count()
-    form = CommentForm(request.POST or None)
-    comment = Comment.objects.filter(post_id=post.id)
+    comment = queries.post_comments(post.id)
     context = {
         'post': post,
         'posts_count': posts_count,
         'comments': comment,
-        'form': form,
+        'viewers': viewers,
     }
     return render(request, template, context)
 
@@ -138,19 +185,40 @@ def add_comment(request, post_id):
 def follow_index(request):
     """Returns follow page."""
     template = PATH_TO_FOLLOW
-    post_list = Post.objects.filter(author__following__user=request.user)
+    post_list = queries.follow_feed(request.user)
     title = 'Страница подписки на автора'
     context = {
         'title': title,
         'page_obj': page_maker(request=request, post_list=post_list),
+        'recommended': queries.recommended_authors(
+            request.user.id).select_related('author'),
     }
     return render(request, template, context)
 
 
+def post_events(request):
+    """Stream new posts of the feed as Server-Sent Events.
+
+    Under core.asgi the stream is read from async_streaming_content in
+    the event loop, WSGI servers read the usual content. Generators do
+    nothing until iterated, so only one of them subscribes. Without
+    EVENTS_ENABLED the answer is 204, clients stop reconnecting.
+    """
+    if not settings.EVENTS_ENABLED:
+        return HttpResponse(status=HTTPStatus.NO_CONTENT)
+    predicate = events.feed_filter(request)
+    response = StreamingHttpResponse(
+        events.stream(predicate), content_type='text/event-stream')
+    response.async_streaming_content = events.stream_async(predicate)
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
 @login_required
 def profile_follow(request, username):
     """How to follow the author."""
-    user = get_object_or_404(User, username=username)
+    user = lookups.user_by_username(username)
     if request.user != user:
         Follow.objects.get_or_create(
             user_id=request.user.id,
@@ -162,6 +230,6 @@ def profile_follow(request, username):
 @login_required
 def profile_unfollow(request, username):
     """How to unfollow the author."""
-    user = get_object_or_404(User, username=username)
+    user = lookups.user_by_username(username)
     Follow.objects.filter(user_id=request.user.id, author_id=user.id).delete()
     return redirect('posts:profile', username=username)
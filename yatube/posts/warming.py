@@ -0,0 +1,122 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.handlers.wsgi import WSGIRequest
+from django.db import close_old_connections
+from django.db.models import Count
+from django.urls import resolve, reverse
+
+from .models import Group, User
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    """Let through at most ``rate`` calls per second over all threads."""
+
+    def __init__(self, rate):
+        self.interval = 1 / rate
+        self.lock = threading.Lock()
+        self.next_call = 0
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            delay = max(0, self.next_call - now)
+            self.next_call = max(now, self.next_call) + self.interval
+        if delay:
+            time.sleep(delay)
+
+
+_executor = None
+_limiter = None
+_start_lock = threading.Lock()
+_pending = set()
+_pending_lock = threading.Lock()
+
+
+def hot_paths():
+    """Paths of the pages to keep in the cache.
+
+    Pages from CACHE_WARMING_URL_NAMES, groups with most posts and
+    authors with most followers.
+    """
+    paths = [reverse(name) for name in settings.CACHE_WARMING_URL_NAMES]
+    slugs = Group.objects.annotate(
+        posts_total=Count('posts')
+    ).order_by('-posts_total').values_list(
+        'slug', flat=True)[:settings.CACHE_WARMING_GROUPS]
+    paths += [reverse('posts:group_list', args=[slug]) for slug in slugs]
+    usernames = User.objects.annotate(
+        followers=Count('following')
+    ).order_by('-followers').values_list(
+        'username', flat=True)[:settings.CACHE_WARMING_AUTHORS]
+    paths += [reverse('posts:profile', args=[name]) for name in usernames]
+    return paths
+
+
+def warm_path(path):
+    """Render the page for a guest, so it gets into the page cache."""
+    request = WSGIRequest({
+        'REQUEST_METHOD': 'GET',
+        'PATH_INFO': path,
+        'SERVER_NAME': settings.ALLOWED_HOSTS[0],
+        'SERVER_PORT': '80',
+        'wsgi.input': BytesIO(),
+        'wsgi.url_scheme': 'http',
+    })
+    request.user = AnonymousUser()
+    request.resolver_match = match = resolve(path)
+    return match.func(request, *match.args, **match.kwargs)
+
+
+def _warm_hot():
+    try:
+        schedule_warming(hot_paths())
+    finally:
+        close_old_connections()
+
+
+def _warm(path):
+    _limiter.wait()
+    with _pending_lock:
+        _pending.discard(path)
+    try:
+        warm_path(path)
+    except Exception:
+        logger.exception('Cache warming of %s failed', path)
+    finally:
+        close_old_connections()
+
+
+def schedule_warming(paths=None):
+    """Warm pages in the background thread pool.
+
+    Without paths the hot pages are warmed, they are looked up in the
+    pool too. Paths already waiting for warming are skipped, so bursts
+    of writes do not pile up jobs. The pool and the rate limit are made
+    once, by the first call of the process.
+    """
+    global _executor, _limiter
+    if _executor is None:
+        with _start_lock:
+            if _executor is None:
+                _limiter = RateLimiter(settings.CACHE_WARMING_RATE)
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.CACHE_WARMING_WORKERS,
+                    thread_name_prefix='cache-warming',
+                )
+    if paths is None:
+        _executor.submit(_warm_hot)
+        return
+    for path in paths:
+        with _pending_lock:
+            if path in _pending:
+                continue
+            _pending.add(path)
+        _executor.submit(_warm, path)
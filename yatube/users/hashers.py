@@ -0,0 +1,74 @@
+import base64
+import hashlib
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth.hashers import (BasePasswordHasher,
+                                         PBKDF2PasswordHasher, mask_hash)
+from django.utils.crypto import constant_time_compare
+from django.utils.translation import gettext_noop as _
+
+
+class TunedPBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """PBKDF2 with PASSWORD_PBKDF2_ITERATIONS iterations.
+
+    Hashes with another count are rehashed on the next login.
+    """
+
+    @property
+    def iterations(self):
+        return settings.PASSWORD_PBKDF2_ITERATIONS
+
+
+class ScryptPasswordHasher(BasePasswordHasher):
+    """Memory-hard scrypt from hashlib with PASSWORD_SCRYPT parameters.
+
+    The hash is scrypt$n$r$p$salt$hash, hashes with other parameters
+    are rehashed on the next login.
+    """
+    algorithm = 'scrypt'
+    dklen = 64
+
+    def params(self):
+        scrypt = settings.PASSWORD_SCRYPT
+        return scrypt['n'], scrypt['r'], scrypt['p']
+
+    def encode(self, password, salt, n=None, r=None, p=None):
+        assert password is not None
+        assert salt and '$' not in salt
+        if n is None:
+            n, r, p = self.params()
+        hash = hashlib.scrypt(
+            password.encode(), salt=salt.encode(), n=n, r=r, p=p,
+            maxmem=256 * n * r * p, dklen=self.dklen,
+        )
+        hash = base64.b64encode(hash).decode('ascii').strip()
+        return '%s$%d$%d$%d$%s$%s' % (self.algorithm, n, r, p, salt, hash)
+
+    def split(self, encoded):
+        algorithm, n, r, p, salt, hash = encoded.split('$', 5)
+        assert algorithm == self.algorithm
+        return int(n), int(r), int(p), salt, hash
+
+    def verify(self, password, encoded):
+        n, r, p, salt, _hash = self.split(encoded)
+        return constant_time_compare(
+            encoded, self.encode(password, salt, n, r, p))
+
+    def safe_summary(self, encoded):
+        n, r, p, salt, hash = self.split(encoded)
+        return OrderedDict([
+            (_('algorithm'), self.algorithm),
+            (_('work factor'), n),
+            (_('block size'), r),
+            (_('parallelism'), p),
+            (_('salt'), mask_hash(salt)),
+            (_('hash'), mask_hash(hash)),
+        ])
+
+    def must_update(self, encoded):
+        return self.split(encoded)[:3] != self.params()
+
+    def harden_runtime(self, password, encoded):
+        # Hashes are updated to the current parameters on login
+        pass
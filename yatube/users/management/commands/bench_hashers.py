@@ -0,0 +1,39 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils.crypto import get_random_string
+from django.utils.module_loading import import_string
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure password checks per second on one core '
+        'for each hashing profile.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--seconds', type=float, default=2,
+            help='Time spent on each profile.')
+
+    def handle(self, *args, **options):
+        password = get_random_string(16)
+        for name, path in settings.PASSWORD_HASHER_PROFILES.items():
+            hasher = import_string(path)()
+            try:
+                encoded = hasher.encode(password, hasher.salt())
+            except ValueError as error:
+                self.stdout.write(f'{name}: unavailable, {error}')
+                continue
+            checks = 0
+            start = time.perf_counter()
+            deadline = start + options['seconds']
+            while time.perf_counter() < deadline:
+                hasher.verify(password, encoded)
+                checks += 1
+            elapsed = time.perf_counter() - start
+            self.stdout.write(
+                f'{name}: {checks / elapsed:.1f} logins/s per core, '
+                f'{elapsed / checks * 1000:.2f} ms each'
+            )
@@ -0,0 +1,46 @@
+import time
+
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+
+class Command(BaseCommand):
+    help = (
+        'Remove expired sessions from the session databases in small '
+        'batches, so other writers do not wait long.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch', type=int, default=settings.SESSION_PURGE_BATCH,
+            help='Sessions removed in one transaction.')
+        parser.add_argument(
+            '--pause', type=float, default=0.05,
+            help='Seconds to sleep between batches.')
+
+    def handle(self, *args, **options):
+        if settings.SESSION_BACKEND == 'cache':
+            self.stdout.write('Sessions in the cache expire by themselves')
+            return
+        now = timezone.now()
+        for alias in settings.SESSION_DATABASES:
+            expired = Session.objects.using(alias).filter(
+                expire_date__lt=now)
+            total = 0
+            while True:
+                # The index on expire_date finds the batch, the write
+                # lock is held only while deleting it
+                keys = list(expired.values_list(
+                    'session_key', flat=True)[:options['batch']])
+                if not keys:
+                    break
+                with transaction.atomic(using=alias):
+                    total += Session.objects.using(alias).filter(
+                        session_key__in=keys).delete()[0]
+                if len(keys) < options['batch']:
+                    break
+                time.sleep(options['pause'])
+            self.stdout.write(f'{alias}: {total} expired sessions removed')
@@ -0,0 +1,76 @@
+from django.conf import settings
+from django.contrib import auth
+from django.contrib.auth import (BACKEND_SESSION_KEY, HASH_SESSION_KEY,
+                                 SESSION_KEY, get_user_model)
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.crypto import constant_time_compare
+from django.utils.functional import SimpleLazyObject
+
+USER_KEY = 'users:user:{}'
+USER_FIELDS = (
+    'id', 'username', 'first_name', 'last_name', 'is_staff', 'is_active'
+)
+
+
+def user_record(user):
+    """Fields of the user to cache and the hash sessions are checked by."""
+    return (
+        tuple(getattr(user, field) for field in USER_FIELDS),
+        user.get_session_auth_hash(),
+    )
+
+
+def forget_user(user_id):
+    cache.delete(USER_KEY.format(user_id))
+
+
+def get_user(request):
+    """User of the session, like django.contrib.auth.get_user.
+
+    The user comes from a cached record when there is one, with the
+    USER_FIELDS loaded, other fields are loaded on access.
+    """
+    User = get_user_model()
+    try:
+        user_id = User._meta.pk.to_python(request.session[SESSION_KEY])
+        backend_path = request.session[BACKEND_SESSION_KEY]
+    except KeyError:
+        return AnonymousUser()
+    if backend_path not in settings.AUTHENTICATION_BACKENDS:
+        return AnonymousUser()
+    key = USER_KEY.format(user_id)
+    record = cache.get(key)
+    if record is None:
+        user = auth.load_backend(backend_path).get_user(user_id)
+        if user is None:
+            return AnonymousUser()
+        record = user_record(user)
+        cache.set(key, record, settings.USER_CACHING_TIME)
+    values, session_hash = record
+    if not values[USER_FIELDS.index('is_active')]:
+        return AnonymousUser()
+    if not constant_time_compare(
+        request.session.get(HASH_SESSION_KEY, ''), session_hash
+    ):
+        # The password was changed, other sessions are logged out
+        request.session.flush()
+        return AnonymousUser()
+    user = User.from_db(DEFAULT_DB_ALIAS, USER_FIELDS, values)
+    user.backend = backend_path
+    return user
+
+
+class CachedAuthenticationMiddleware(AuthenticationMiddleware):
+    """AuthenticationMiddleware which takes users from the cache.
+
+    With sessions in the cache too a logged-in request makes no
+    queries before the view. Changed users are dropped from the cache,
+    other processes see that only with a shared cache; otherwise
+    USER_CACHING_TIME is a few seconds.
+    """
+
+    def process_request(self, request):
+        request.user = SimpleLazyObject(lambda: get_user(request))
@@ -0,0 +1,23 @@
+from django.conf import settings
+
+
+class SessionRouter:
+    """Keep the session table in SESSION_DATABASES and nothing else there.
+
+    users.sessions picks the database of each session itself, other
+    queries of sessions go to the first one.
+    """
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label == 'sessions':
+            return settings.SESSION_DATABASES[0]
+        return None
+
+    db_for_write = db_for_read
+
+    def allow_migrate(self, db, app_label, **hints):
+        if db in settings.SESSION_DATABASES and db != 'default':
+            return app_label == 'sessions'
+        if app_label == 'sessions':
+            return db in settings.SESSION_DATABASES
+        return None
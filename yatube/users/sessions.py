@@ -0,0 +1,80 @@
+"""Session engine keeping cached_db sessions in SESSION_DATABASES.
+
+Sessions are spread over the databases by a hash of the key, so logins
+and logouts do not write to the database of the posts.
+"""
+import zlib
+
+from django.conf import settings
+from django.contrib.sessions.backends.base import CreateError, UpdateError
+from django.contrib.sessions.backends.cached_db import (
+    SessionStore as CachedDBStore)
+from django.contrib.sessions.backends.db import SessionStore as DBStore
+from django.core.exceptions import SuspiciousOperation
+from django.db import DatabaseError, IntegrityError, transaction
+from django.utils import timezone
+
+
+def database_for(session_key):
+    """Alias of the database holding the session."""
+    aliases = settings.SESSION_DATABASES
+    return aliases[zlib.crc32(session_key.encode()) % len(aliases)]
+
+
+class ShardedDBStore(DBStore):
+    """Database sessions, each in the database chosen by its key."""
+
+    def sessions(self, session_key):
+        return self.model.objects.using(database_for(session_key))
+
+    def _get_session_from_db(self):
+        try:
+            return self.sessions(self.session_key).get(
+                session_key=self.session_key,
+                expire_date__gt=timezone.now(),
+            )
+        except (self.model.DoesNotExist, SuspiciousOperation):
+            self._session_key = None
+
+    def exists(self, session_key):
+        return self.sessions(session_key).filter(
+            session_key=session_key).exists()
+
+    def save(self, must_create=False):
+        if self.session_key is None:
+            return self.create()
+        data = self._get_session(no_load=must_create)
+        obj = self.create_model_instance(data)
+        using = database_for(self.session_key)
+        try:
+            with transaction.atomic(using=using):
+                obj.save(
+                    force_insert=must_create,
+                    force_update=not must_create,
+                    using=using,
+                )
+        except IntegrityError:
+            if must_create:
+                raise CreateError
+            raise
+        except DatabaseError:
+            if not must_create:
+                raise UpdateError
+            raise
+
+    def delete(self, session_key=None):
+        if session_key is None:
+            if self.session_key is None:
+                return
+            session_key = self.session_key
+        self.sessions(session_key).filter(session_key=session_key).delete()
+
+    @classmethod
+    def clear_expired(cls):
+        for alias in settings.SESSION_DATABASES:
+            cls.get_model_class().objects.using(alias).filter(
+                expire_date__lt=timezone.now()).delete()
+
+
+class SessionStore(CachedDBStore, ShardedDBStore):
+    """Sessions read from the cache, written through to their database."""
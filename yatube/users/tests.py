@@ -1,3 +1,117 @@
-# from django.test import TestCase
+from datetime import timedelta
+from io import StringIO
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.utils import timezone
+
+from .hashers import ScryptPasswordHasher
+from .middleware import get_user
+from .sessions import SessionStore
+
+User = get_user_model()
+
+
+class CachedAuthenticationTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='auth', first_name='Ivan', email='ivan@example.com')
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def request(self):
+        request = RequestFactory().get('/')
+        request.session = self.client.session
+        return request
+
+    def test_user_without_queries(self):
+        """Session and user of a repeated request come from the cache."""
+        self.assertEqual(get_user(self.request()), self.user)
+        with self.assertNumQueries(0):
+            user = get_user(self.request())
+            self.assertEqual(
+                (user.pk, user.get_full_name(), user.is_staff),
+                (self.user.pk, 'Ivan', False),
+            )
+        self.assertEqual(user.email, 'ivan@example.com')
+
+    def test_changed_user_is_reloaded(self):
+        """Renamed users are loaded again, password change logs out."""
+        get_user(self.request())
+        self.user.first_name = 'Petr'
+        self.user.save()
+        self.assertEqual(get_user(self.request()).get_full_name(), 'Petr')
+        self.user.set_password('new-password')
+        self.user.save()
+        self.assertIsInstance(get_user(self.request()), AnonymousUser)
+
+
+class SessionsTest(TestCase):
+    def test_sharded_store(self):
+        """Sessions are saved, loaded without cache and deleted."""
+        session = SessionStore()
+        session['user'] = 'auth'
+        session.save()
+        cache.clear()
+        loaded = SessionStore(session.session_key)
+        self.assertEqual(loaded['user'], 'auth')
+        self.assertTrue(loaded.exists(session.session_key))
+        loaded.delete()
+        self.assertFalse(Session.objects.exists())
+
+    def test_purge_expired_sessions(self):
+        """Expired sessions are removed in batches, live ones stay."""
+        now = timezone.now()
+        Session.objects.bulk_create(
+            Session(
+                session_key=f'expired{i}', session_data='',
+                expire_date=now - timedelta(days=1),
+            )
+            for i in range(5)
+        )
+        Session.objects.create(
+            session_key='live', session_data='',
+            expire_date=now + timedelta(days=1),
+        )
+        out = StringIO()
+        call_command('purge_sessions', batch=2, pause=0, stdout=out)
+        self.assertIn('default: 5 expired sessions removed', out.getvalue())
+        self.assertEqual(
+            list(Session.objects.values_list('session_key', flat=True)),
+            ['live'],
+        )
+
+
+@override_settings(
+    PASSWORD_HASHERS=[
+        'users.hashers.ScryptPasswordHasher',
+        'users.hashers.TunedPBKDF2PasswordHasher',
+    ],
+    PASSWORD_SCRYPT={'n': 2 ** 4, 'r': 8, 'p': 1},
+    PASSWORD_PBKDF2_ITERATIONS=10,
+)
+class PasswordHashingTest(TestCase):
+    def test_rehash_on_login(self):
+        """Old hashes are replaced with the chosen profile on login."""
+        user = User(username='auth')
+        with self.settings(PASSWORD_HASHERS=[
+            'users.hashers.TunedPBKDF2PasswordHasher',
+        ]):
+            user.set_password('secret-password')
+        user.save()
+        self.assertTrue(user.password.startswith('pbkdf2_sha256$10$'))
+        self.assertTrue(
+            Client().login(username='auth', password='secret-password'))
+        user.refresh_from_db()
+        self.assertTrue(user.password.startswith('scrypt$16$8$1$'))
+        with self.settings(PASSWORD_SCRYPT={'n': 2 ** 5, 'r': 8, 'p': 1}):
+            self.assertTrue(ScryptPasswordHasher().must_update(
+                user.password))
+            self.assertTrue(user.check_password('secret-password'))
+        self.assertTrue(user.password.startswith('scrypt$32$8$1$'))
+        self.assertFalse(user.check_password('wrong-password'))
@@ -0,0 +1,35 @@
+"""
+ASGI config for yatube project.
+
+It exposes the ASGI callable as a module-level variable named
+``application``, e.g. ``uvicorn yatube.asgi:application``.
+
+Django 2.2 has no ASGI support, views run in the bounded thread pool of
+``core.asgi.ASGIHandler`` (ASGI_THREADS).
+"""
+
+import os
+
+from django.conf import settings
+
+from core.asgi import get_asgi_application
+from core.warmup import warm_templates
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+# Event streams wait in the event loop and hold no thread
+os.environ.setdefault('EVENTS_ENABLED', '1')
+
+application = get_asgi_application()
+
+# Models can be imported only after the application is set up
+from posts.follow_graph import get_graph  # noqa: E402
+from posts.warming import schedule_warming  # noqa: E402
+
+if settings.TEMPLATES_WARM_UP:
+    warm_templates()
+
+if settings.CACHE_WARMING:
+    schedule_warming()
+
+if settings.FOLLOW_GRAPH:
+    get_graph()
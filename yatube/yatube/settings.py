@@ -23,7 +23,7 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 SECRET_KEY = '+!7e5h28l=l&lq*%aa(q1c!@73)nlcfa!&&l^*13(x!we)&aj3'
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+DEBUG = os.getenv('DEBUG', 'True') not in ('0', 'False', 'false')
 
 ALLOWED_HOSTS = [
     'localhost',
@@ -40,6 +40,7 @@ INSTALLED_APPS = [
     'users.apps.UsersConfig',
     'core.apps.CoreConfig',
     'about.apps.AboutConfig',
+    'api.apps.ApiConfig',
     'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
@@ -51,10 +52,13 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.static.StaticFilesMiddleware',
+    'core.compression.CompressionMiddleware',
+    'django.middleware.http.ConditionalGetMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'users.middleware.CachedAuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -62,18 +66,37 @@ MIDDLEWARE = [
 ROOT_URLCONF = 'yatube.urls'
 
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
+
+# Template loaders: production profile keeps compiled templates in memory
+# and skips file-system checks, debug profile rereads them on every render
+
+TEMPLATE_LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+if not DEBUG:
+    TEMPLATE_LOADERS = [
+        ('django.template.loaders.cached.Loader', TEMPLATE_LOADERS),
+    ]
+
+# Compile all templates from TEMPLATES_DIR when a worker starts
+
+TEMPLATES_WARM_UP = not DEBUG
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
-        'APP_DIRS': True,
         'OPTIONS': {
+            'debug': DEBUG,
+            'loaders': TEMPLATE_LOADERS,
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
                 'core.context_processors.year.year',
+                'core.context_processors.events.events',
             ],
         },
     },
@@ -81,6 +104,11 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'yatube.wsgi.application'
 
+# Threads running views under yatube.asgi, the event loop holds the rest
+# of the connections
+
+ASGI_THREADS = 16
+
 
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
@@ -92,6 +120,62 @@ DATABASES = {
     }
 }
 
+# Sessions, by SESSION_BACKEND:
+# cached_db - read from the cache, written through to the database;
+# sharded - the same in SESSION_SHARDS databases of their own, spread by
+#   the session key, each migrated with migrate --database=sessions_<n>;
+# cache - only in the cache, expiring with the session, CACHES must be
+#   shared by the processes then.
+# Users of the sessions are cached by users.middleware for USER_CACHING_TIME.
+
+SESSION_BACKEND = os.getenv('SESSION_BACKEND', 'cached_db')
+SESSION_SHARDS = int(os.getenv('SESSION_SHARDS', '2'))
+SESSION_DATABASES = ['default']
+if SESSION_BACKEND == 'sharded':
+    SESSION_ENGINE = 'users.sessions'
+    SESSION_DATABASES = [
+        f'sessions_{shard}' for shard in range(SESSION_SHARDS)
+    ]
+    DATABASES.update({
+        alias: {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.path.join(BASE_DIR, f'{alias}.sqlite3'),
+        }
+        for alias in SESSION_DATABASES
+    })
+    DATABASE_ROUTERS = ['users.routers.SessionRouter']
+elif SESSION_BACKEND == 'cache':
+    SESSION_ENGINE = 'django.contrib.sessions.backends.cache'
+else:
+    SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
+# Expired sessions removed by manage.py purge_sessions in one transaction
+
+SESSION_PURGE_BATCH = 500
+
+
+# Password hashing profile, by PASSWORD_HASHING: pbkdf2, scrypt or argon2
+# (needs argon2-cffi). Hashes of the other profiles are still accepted and
+# rehashed with the chosen one on login, as are hashes with other
+# parameters. yatube.settings_test switches to the fast profile, unsuitable
+# for real passwords. manage.py bench_hashers measures logins per second
+# per core.
+
+PASSWORD_HASHING = os.getenv('PASSWORD_HASHING', 'pbkdf2')
+PASSWORD_PBKDF2_ITERATIONS = int(
+    os.getenv('PASSWORD_PBKDF2_ITERATIONS', '150000'))
+PASSWORD_SCRYPT = {'n': 2 ** 14, 'r': 8, 'p': 1}
+PASSWORD_HASHER_PROFILES = {
+    'pbkdf2': 'users.hashers.TunedPBKDF2PasswordHasher',
+    'scrypt': 'users.hashers.ScryptPasswordHasher',
+    'argon2': 'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'fast': 'django.contrib.auth.hashers.MD5PasswordHasher',
+}
+PASSWORD_HASHERS = [PASSWORD_HASHER_PROFILES[PASSWORD_HASHING]] + [
+    hasher for name, hasher in PASSWORD_HASHER_PROFILES.items()
+    if name not in (PASSWORD_HASHING, 'fast')
+]
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -134,6 +218,31 @@ USE_TZ = True
 STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
 
 STATIC_URL = '/static/'
+STATIC_ROOT = os.path.join(BASE_DIR, 'collected_static')
+
+# With STATIC_PIPELINE (on outside DEBUG) collectstatic gives files
+# names with content hashes and writes .br (with the brotli package) and
+# .gz variants of text files at least STATIC_COMPRESS_MIN_SIZE bytes long
+# which shrink by MIN_SAVING. Run it before starting the application.
+# Without a proxy in front, STATIC_SERVE serves them from the application.
+
+STATIC_PIPELINE = os.getenv('STATIC_PIPELINE', '0' if DEBUG else '1') == '1'
+if STATIC_PIPELINE:
+    STATICFILES_STORAGE = 'core.storage.CompressedManifestStaticFilesStorage'
+STATIC_COMPRESS_MIN_SIZE = 256
+STATIC_COMPRESS_MIN_SAVING = 0.05
+STATIC_SERVE = os.getenv('STATIC_SERVE', '0' if DEBUG else '1') == '1'
+STATIC_MAX_AGE = 60 * 60
+
+# Responses of at least COMPRESSION_MIN_SIZE bytes are compressed with
+# brotli (if installed) or gzip at levels chosen by size: up to the size
+# of the pair at its level, the last pair has no limit
+
+COMPRESSION_MIN_SIZE = 200
+COMPRESSION_LEVELS = {
+    'br': [(16 * 1024, 9), (256 * 1024, 6), (None, 4)],
+    'gzip': [(16 * 1024, 9), (256 * 1024, 6), (None, 4)],
+}
 
 # Pages to show in LogIn and LogOut
 
@@ -142,14 +251,115 @@ LOGIN_REDIRECT_URL = 'posts:index'
 # LOGOUT_REDIRECT_URL = 'posts:index'
 
 # Email Simulation
+# Views put mail to the queue of core.mail, a worker thread sends it in
+# batches over one connection of MAIL_QUEUE_BACKEND, retrying failures
+# after MAIL_QUEUE_BACKOFF seconds doubled on each attempt
 
-EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
+EMAIL_BACKEND = 'core.mail.QueuedEmailBackend'
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
+MAIL_QUEUE_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
+MAIL_QUEUE_BATCH = 50
+MAIL_QUEUE_RETRIES = 5
+MAIL_QUEUE_BACKOFF = 1
+MAIL_QUEUE_SHUTDOWN_TIMEOUT = 5
+
+# Address of the site in emails
+
+SITE_URL = 'http://localhost:8000'
+
+# Digests of new posts by followed authors, sent by manage.py send_digests
+# every DIGEST_PERIOD seconds, users are handled in chunks of DIGEST_CHUNK
+
+DIGEST_PERIOD = 60 * 60 * 24
+DIGEST_CHUNK = 500
+DIGEST_MAX_POSTS = 10
+DIGEST_SUBJECT = 'Новые записи избранных авторов'
+DIGEST_FRAGMENT_CACHE_SIZE = 10000
 
 # Paginator
 
 POSTS_IN_PAGINATOR = 10
 
+# Live updates of the feeds (Server-Sent Events). Events are shared by
+# the processes of one host with 'core.pubsub.SocketBroker'. Queue size
+# is per client, times are in seconds. An open stream takes a worker
+# thread of a WSGI server for EVENTS_STREAM_TIME, so streams are on only
+# under yatube.asgi or with EVENTS_ENABLED, otherwise feeds do not open
+# them.
+
+EVENTS_ENABLED = os.getenv('EVENTS_ENABLED', '0') == '1'
+EVENTS_BROKER = 'core.pubsub.LocalBroker'
+EVENTS_SOCKET_DIR = os.path.join(BASE_DIR, 'events')
+EVENTS_QUEUE_SIZE = 100
+EVENTS_MAX_SIZE = 64 * 1024
+EVENTS_HEARTBEAT = 15
+EVENTS_STREAM_TIME = 5 * 60
+EVENTS_RETRY_MS = 3000
+
+# Follows kept in memory of every process (posts.follow_graph), changes of
+# other processes are read from a log in the database every
+# FOLLOW_GRAPH_SYNC seconds, including SYNC_MARGIN seconds read before.
+# The log keeps FOLLOW_GRAPH_LOG_TIME seconds, cut by one change in
+# 1 / TRIM_CHANCE.
+
+FOLLOW_GRAPH = not DEBUG
+FOLLOW_GRAPH_SYNC = 5
+FOLLOW_GRAPH_SYNC_MARGIN = 30
+FOLLOW_GRAPH_LOG_TIME = 60 * 60 * 24
+FOLLOW_GRAPH_TRIM_CHANCE = 0.001
+
+# Authors recommended to each user by manage.py recommend_authors and
+# readers of an author compared to find authors followed together
+
+RECOMMENDATIONS_TOP = 10
+RECOMMENDATIONS_SAMPLE = 50
+
+# Groups by slug and users by username for the views, kept in the shared
+# cache and in an LRU of each process, which may lag for LOCAL_TIMEOUT
+# seconds after a rename
+
+LOOKUP_CACHE_SIZE = 1024
+LOOKUP_LOCAL_TIMEOUT = 10
+LOOKUP_CACHING_TIME = 60 * 60
+
+# Counters kept in memory are added to the database in background
+# threads, by the request that finds them due or by a timer of the
+# process while the site is quiet, and at exit. Under DEBUG only by
+# the request.
+
+COUNTERS_FLUSH_IN_BACKGROUND = not DEBUG
+
+# Views of posts, flushed every VIEW_COUNTS_FLUSH_INTERVAL seconds and at
+# exit. Unique viewers are estimated with HyperLogLog of 2 ** PRECISION
+# one-byte registers per post, the error is about 1.04 / sqrt(registers).
+
+VIEW_COUNTS_FLUSH_INTERVAL = 10
+VIEW_COUNTS_SHARDS = 16
+VIEW_COUNTS_UNIQUE = True
+VIEW_COUNTS_HLL_PRECISION = 10
+
+# Trending posts and groups: engagement halves every TRENDING_HALF_LIFE
+# seconds. Comments and a sampled share of post views are counted in
+# memory and added to the database every TRENDING_FLUSH_INTERVAL seconds,
+# scores are kept relative to the start of a TRENDING_EPOCH.
+
+TRENDING_HALF_LIFE = 60 * 60 * 6
+TRENDING_EPOCH = 60 * 60 * 24
+TRENDING_COMMENT_WEIGHT = 5
+TRENDING_VIEW_WEIGHT = 1
+TRENDING_VIEW_SAMPLE = 0.1
+TRENDING_FLUSH_INTERVAL = 30
+TRENDING_GROUPS = 5
+
+# JSON API, the most rows on one page
+
+API_MAX_LIMIT = 100
+
+# JSON API, the most items in one batch and rows in one INSERT
+
+API_BULK_MAX_ITEMS = 1000
+API_BULK_BATCH = 200
+
 
 # Function for Error403
 
@@ -161,12 +371,61 @@ CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Uploads are served by the application unless MEDIA_SERVE is off. With
+# MEDIA_ACCEL set to 'x-accel-redirect' nginx sends the file from its
+# internal location MEDIA_ACCEL_PREFIX, with 'x-sendfile' Apache or
+# lighttpd send it by its path. New uploads never overwrite old files,
+# so browsers keep them for MEDIA_MAX_AGE seconds.
+
+MEDIA_SERVE = os.getenv('MEDIA_SERVE', '1') == '1'
+MEDIA_ACCEL = os.getenv('MEDIA_ACCEL', '')
+MEDIA_ACCEL_PREFIX = '/protected-media/'
+MEDIA_MAX_AGE = 60 * 60 * 24 * 30
+
+# gc_media removes uploads and thumbnails unchanged for GC_MEDIA_MIN_AGE
+# seconds which nothing refers to, GC_MEDIA_BATCH at once and no more
+# than GC_MEDIA_RATE a second (0 for no limit)
 
-# Cache, time in seconds
+GC_MEDIA_BATCH = 500
+GC_MEDIA_RATE = 0
+GC_MEDIA_MIN_AGE = 60 * 60
+
+
+# Cache, time in seconds. Invalidations reach other processes only
+# through a shared cache (CACHE_BACKEND of memcached at CACHE_LOCATION),
+# with the default cache of each process things changed elsewhere are
+# cached for a short time.
 
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
     }
 }
+CACHE_SHARED = CACHES['default']['BACKEND'] not in (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
 CACHING_TIME = 20
+
+# Users of sessions, dropped on password changes and deactivation
+
+USER_CACHING_TIME = 60 * 15 if CACHE_SHARED else 5
+
+# Group, profile and post pages are refreshed on changes, with a shared
+# cache the timeout only limits how long unused pages stay in it. Without
+# one other processes miss the changes, pages expire as soon as the index
+
+PAGE_CACHING_TIME = 60 * 15 if CACHE_SHARED else CACHING_TIME
+
+# Warming of hot pages in background threads after start and new posts:
+# pages by URL name, groups with most posts and authors with most
+# followers. Rate is the number of pages per second.
+
+CACHE_WARMING = not DEBUG
+CACHE_WARMING_URL_NAMES = ['posts:index']
+CACHE_WARMING_GROUPS = 5
+CACHE_WARMING_AUTHORS = 5
+CACHE_WARMING_WORKERS = 2
+CACHE_WARMING_RATE = 10
@@ -0,0 +1,21 @@
+"""Settings for test runs: fast password hashing, unsuitable for real use,
+and uploads in a temporary directory removed on exit.
+
+python manage.py test --settings=yatube.settings_test
+"""
+
+import atexit
+import shutil
+import tempfile
+
+from .settings import *  # noqa: F401,F403
+from .settings import PASSWORD_HASHER_PROFILES
+
+PASSWORD_HASHING = 'fast'
+PASSWORD_HASHERS = [PASSWORD_HASHER_PROFILES[PASSWORD_HASHING]] + [
+    hasher for name, hasher in PASSWORD_HASHER_PROFILES.items()
+    if name != PASSWORD_HASHING
+]
+
+MEDIA_ROOT = tempfile.mkdtemp()
+atexit.register(shutil.rmtree, MEDIA_ROOT, ignore_errors=True)
@@ -9,8 +9,24 @@ https://docs.djangoproject.com/en/2.2/howto/deployment/wsgi/
 
 import os
 
+from django.conf import settings
 from django.core.wsgi import get_wsgi_application
 
+from core.warmup import warm_templates
+
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
 
 application = get_wsgi_application()
+
+# Models can be imported only after the application is set up
+from posts.follow_graph import get_graph  # noqa: E402
+from posts.warming import schedule_warming  # noqa: E402
+
+if settings.TEMPLATES_WARM_UP:
+    warm_templates()
+
+if settings.CACHE_WARMING:
+    schedule_warming()
+
+if settings.FOLLOW_GRAPH:
+    get_graph()